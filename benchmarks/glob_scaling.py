@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Glob pattern scaling benchmark
+
+Times GlobsFile lookups against globs2 files with more and more wildcard
+patterns, next to the fnmatch loop over every pattern it replaced: the
+first lookup, which builds the matcher, then hits and misses once the
+patterns they test are compiled.
+
+	python benchmarks/glob_scaling.py [-n LOOKUPS] [COUNT...]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+from fnmatch import fnmatchcase
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mime.xdg.mime import GlobsFile
+
+
+def patterns(count):
+	"""
+	Returns count (mime, glob) tuples, in the shapes found in globs2 files:
+	leading literals, leading wildcards and character classes
+	"""
+	ret = []
+	for i in range(count):
+		mime = "application/x-scale-%i" % (i)
+		shape = i % 4
+		if shape == 0:
+			ret.append((mime, "bench-%05i-*.log" % (i)))
+		elif shape == 1:
+			ret.append((mime, "*.x%05i.*" % (i)))
+		elif shape == 2:
+			ret.append((mime, "[Mm]akefile%05i" % (i)))
+		else:
+			ret.append((mime, "*-%05i.[0-9]" % (i)))
+	return ret
+
+def fnmatchLoop(globs, name):
+	ret = None
+	for mime, glob in globs:
+		if fnmatchcase(name, glob):
+			ret = mime
+	return ret
+
+def main():
+	from optparse import OptionParser
+	parser = OptionParser(usage="%prog [options] [COUNT...]")
+	parser.add_option("-n", "--lookups", type="int", default=200, help="lookups per measurement")
+	options, args = parser.parse_args()
+	counts = [int(arg) for arg in args] or [500, 2000, 5000, 20000]
+
+	root = tempfile.mkdtemp(prefix="mime-bench-")
+	try:
+		print("%8s %10s %10s %10s %12s" % ("patterns", "build (ms)", "hit (us)", "miss (us)", "fnmatch (us)"))
+		for count in counts:
+			globs = patterns(count)
+			path = os.path.join(root, "globs2")
+			with open(path, "w") as file:
+				for mime, glob in globs:
+					file.write("50:%s:%s\n" % (mime, glob))
+
+			table = GlobsFile()
+			table.parse(path)
+			build = timeit.timeit(lambda: table.match("warmup"), number=1)
+			hits = ["bench-%05i-1.log" % (i - i % 4) for i in range(0, count, max(count // options.lookups, 1))]
+			misses = ["notes-%i.unknown" % (i) for i in range(options.lookups)]
+			for name in hits:
+				table.match(name)
+			hit = timeit.timeit(lambda: [table.match(name) for name in hits], number=1) / len(hits)
+			miss = timeit.timeit(lambda: [table.match(name) for name in misses], number=1) / len(misses)
+			loop = timeit.timeit(lambda: [fnmatchLoop(globs, name) for name in misses[:10]], number=1) / 10
+			print("%8i %10.1f %10.1f %10.1f %12.1f" % (count, build * 1000, hit * 1e6, miss * 1e6, loop * 1e6))
+	finally:
+		shutil.rmtree(root)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Import-time benchmark
+
+Compares the cost of a fresh process importing mime and doing a lookup that
+needs no database (lazy), with one that loads every table up front through
+mime.preload() (what importing used to cost).
+
+	python benchmarks/import_time.py [-n RUNS]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = (
+	("baseline", "pass"),
+	("lazy", "import mime; mime.MimeType.fromScheme('http://example.com')"),
+	("preload", "import mime; mime.preload()"),
+)
+
+def timeit(code, runs):
+	env = dict(os.environ, PYTHONPATH=ROOT)
+	best = None
+	for i in range(runs):
+		start = time.time()
+		subprocess.check_call([sys.executable, "-c", code], env=env)
+		elapsed = time.time() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+def main():
+	from optparse import OptionParser
+	parser = OptionParser()
+	parser.add_option("-n", "--runs", type="int", default=20, help="processes to spawn per case")
+	options, args = parser.parse_args()
+
+	results = [(name, timeit(code, options.runs)) for name, code in CASES]
+	base = results[0][1]
+	for name, elapsed in results:
+		print("%-10s %8.2f ms  (+%.2f ms)" % (name, elapsed * 1000, (elapsed - base) * 1000))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Magic parser benchmark
+
+Times MagicFile.parse, which parses the whole file from a single buffer,
+against the byte-at-a-time parser it replaced, on the system magic file.
+
+	python benchmarks/magic_parse.py [-n RUNS] [PATH]
+"""
+
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mime.xdg.mime import MagicFile
+
+
+class LegacyMagicFile(MagicFile):
+	"""
+	The previous parser, reading the file with read(1) and seek(-1)
+	"""
+	def readNumber(self, file):
+		ret = bytearray()
+		c = file.read(1)
+		while c:
+			if not c.isdigit():
+				file.seek(-1, os.SEEK_CUR)
+				break
+			ret.append(ord(c))
+			c = file.read(1)
+
+		return ret and int(ret.decode("utf-8")) or 0
+
+	def parse(self, path):
+		with open(path, "rb") as file:
+			if not file.read(12) == b"MIME-Magic\0\n":
+				raise ValueError("Bad header for file %r" % (path))
+
+			while True:
+				c = file.read(1)
+				if not c:
+					return
+
+				s = bytearray()
+				while True:
+					c = file.read(1)
+					if c == b"]":
+						break
+					s.append(ord(c))
+				priority, mime = s.decode("utf-8").split(":")
+				file.read(1)
+
+				rules = []
+				while True:
+					c = file.read(1)
+					if not c:
+						break
+					file.seek(-1, os.SEEK_CUR)
+					if c == b"[":
+						break
+					rules.append(self.parseSectionBody(file))
+
+				self.addSection(int(priority), mime, rules)
+
+	def parseSectionBody(self, file):
+		indent = 0
+		c = file.read(1)
+		if c != b">":
+			file.seek(-1, os.SEEK_CUR)
+			indent = self.readNumber(file)
+			file.read(1)
+
+		startOffset = self.readNumber(file)
+		file.read(1)
+
+		valueLength, = struct.unpack(">H", file.read(2))
+		value = file.read(valueLength)
+		mask = None
+		wordSize = 1
+		rangeLength = 1
+
+		while True:
+			c = file.read(1)
+			if c == b"\n":
+				break
+			elif c == b"&":
+				mask = file.read(valueLength)
+			elif c == b"~":
+				wordSize = self.readNumber(file)
+			elif c == b"+":
+				rangeLength = self.readNumber(file)
+			else:
+				while c and c != b"\n":
+					c = file.read(1)
+				break
+
+		return self.Magic(indent, startOffset, value, mask, wordSize, rangeLength)
+
+
+def dump(magic):
+	def rule(r):
+		return (r.indent, r.start, r.value, r.mask, r.wordSize, r.rangeLength, [rule(child) for child in r.children])
+	return [(priority, mime, [rule(r) for r in rules]) for priority, mime, rules in magic._sections]
+
+def bench(classes, path, runs):
+	"""
+	Returns the best time of each class in classes at parsing path.
+	Runs alternate between them, so that a busy or throttled machine slows
+	them down alike rather than whichever happens to run at the time.
+	"""
+	def parse(cls):
+		return lambda: cls().parse(path)
+	ret = [float("inf")] * len(classes)
+	for i in range(runs):
+		for j, cls in enumerate(classes):
+			ret[j] = min(ret[j], timeit.timeit(parse(cls), number=1))
+	return ret
+
+def main():
+	from optparse import OptionParser
+	parser = OptionParser(usage="%prog [options] [PATH]")
+	parser.add_option("-n", "--runs", type="int", default=50, help="parses per parser")
+	options, args = parser.parse_args()
+	path = args and args[0] or "/usr/share/mime/magic"
+
+	legacy, current = LegacyMagicFile(), MagicFile()
+	legacy.parse(path)
+	current.parse(path)
+	if dump(legacy) != dump(current):
+		sys.exit("The parsers disagree on %r" % (path))
+
+	print("%s: %i sections, %i bytes" % (path, len(current._sections), os.path.getsize(path)))
+	before, after = bench((LegacyMagicFile, MagicFile), path, options.runs)
+	print("legacy  %8.2f ms" % (before * 1000))
+	print("buffer  %8.2f ms  (%.1fx)" % (after * 1000, before / after))
+
+if __name__ == "__main__":
+	main()
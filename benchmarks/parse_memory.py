@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Globs and mimeinfo.cache parser benchmark
+
+Measures the time, the peak memory and the memory kept by GlobsFile.parse
+and CacheFile.parse, against the parsers they replaced: tuple keys with
+per-line flag lists for globs2, RawConfigParser and list.insert(0) for
+mimeinfo.cache. Both files are generated, see tree.py.
+
+	python benchmarks/parse_memory.py [-n RUNS] [-t TYPES]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tree
+from mime.xdg import xdg
+from mime.xdg.actions import CacheFile
+from mime.xdg.mime import GlobsFile, isWildcard
+
+
+def legacyAddKey(table, glob, key):
+	keys = table.setdefault(glob, [])
+	keys.append(key)
+	keys.sort(reverse=True)
+
+class LegacyGlobsFile(GlobsFile):
+	"""
+	The previous parser, with (weight, length, (file, -index), mime) keys
+	"""
+	def parse(self, path):
+		self._files += 1
+		count = 0
+		with open(path, "r") as file:
+			for line in file:
+				if line.startswith("#"):
+					continue
+
+				if line.endswith("\n"):
+					line = line[:-1]
+
+				weight, _, line = line.partition(":")
+				mime, _, line = line.partition(":")
+				glob, _, line = line.partition(":")
+				flags, _, line = line.partition(":")
+				flags = flags and flags.split(",") or []
+
+				key = (int(weight), len(glob), (self._files, -count), mime)
+				count += 1
+
+				if not isWildcard(glob):
+					legacyAddKey(self._literals, glob, key)
+					if "cs" not in flags:
+						legacyAddKey(self._foldedLiterals, glob, key)
+				elif glob.startswith("*.") and not isWildcard(glob[1:]):
+					legacyAddKey(self._extensions, glob[1:], key)
+					if "cs" not in flags:
+						legacyAddKey(self._foldedExtensions, glob[1:], key)
+				else:
+					self._matches.append((key, glob, flags))
+
+class LegacyCacheFile(CacheFile):
+	"""
+	The previous parser, through RawConfigParser
+	"""
+	def parse(self, path):
+		xdg.IniFile.parse(self, path)
+
+	def parseKeys(self):
+		for mime, apps in self.cfg.items("MIME Cache"):
+			if mime not in self.keys:
+				self.keys[mime] = []
+			for app in apps.split(";"):
+				if app:
+					self.keys[mime].insert(0, app)
+
+
+def measure(cls, path, runs):
+	"""
+	Returns the best time, and the peak and retained memory, in bytes, of
+	parsing path into a new cls
+	"""
+	def parse():
+		ret = cls()
+		ret.parse(path)
+		return ret
+
+	elapsed = min(timeit.repeat(parse, number=1, repeat=runs))
+
+	tracemalloc.start()
+	table = parse()
+	retained, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	del table
+	return elapsed, peak, retained
+
+def main():
+	from optparse import OptionParser
+	parser = OptionParser()
+	parser.add_option("-n", "--runs", type="int", default=5, help="parses per parser")
+	parser.add_option("-t", "--types", type="int", default=50000, help="MIME types in the generated files")
+	options, args = parser.parse_args()
+
+	root = tempfile.mkdtemp(prefix="mime-bench-")
+	try:
+		tree.generate(root, options.types, files=False)
+		share = os.path.join(root, "share")
+		for name, legacy, current in (
+			("mime/globs2", LegacyGlobsFile, GlobsFile),
+			("applications/mimeinfo.cache", LegacyCacheFile, CacheFile),
+		):
+			path = os.path.join(share, name)
+			print("%s: %i bytes" % (name, os.path.getsize(path)))
+			before = measure(legacy, path, options.runs)
+			after = measure(current, path, options.runs)
+			print("          %10s %12s %12s" % ("time (ms)", "peak (KiB)", "kept (KiB)"))
+			for label, (elapsed, peak, retained) in (("legacy", before), ("current", after)):
+				print("%-9s %10.1f %12i %12i" % (label, elapsed * 1000, peak // 1024, retained // 1024))
+			print("ratio     %9.2fx %11.2fx %11.2fx" % tuple(b / float(a) for a, b in zip(after, before)))
+	finally:
+		shutil.rmtree(root)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""
+Benchmark suite
+
+Times the hot paths of the library against a synthetic data tree (see
+tree.py), so that results only depend on the code and the seed, and can be
+compared between runs:
+
+	python benchmarks/suite.py -o before.json
+	python benchmarks/suite.py -o after.json -c before.json
+
+Every benchmark reports the best and median of its runs, in seconds, and
+the best time per operation, in microseconds.
+"""
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tree
+
+VERSION = 1
+
+
+def measure(func, runs, setup=None):
+	"""
+	Returns the times of runs calls to func, each preceded by an untimed
+	call to setup
+	"""
+	ret = []
+	for i in range(runs):
+		if setup is not None:
+			setup()
+		start = time.time()
+		func()
+		ret.append(time.time() - start)
+	return ret
+
+def spawn(code, env, runs):
+	"""
+	Returns the times of runs fresh processes running code, minus the
+	time of an empty one
+	"""
+	env = dict(os.environ, PYTHONPATH=ROOT, **env)
+	def run(code):
+		return lambda: subprocess.check_call([sys.executable, "-c", code], env=env)
+	baseline = min(measure(run("pass"), runs))
+	return [max(elapsed - baseline, 0) for elapsed in measure(run(code), runs)]
+
+def summarize(times, ops=1):
+	times = sorted(times)
+	return {
+		"ops": ops,
+		"min": times[0],
+		"median": times[len(times) // 2],
+		"per_op_us": times[0] / ops * 1e6,
+	}
+
+
+def benchImport(root, env, runs):
+	# Disabling the snapshot, the tables are parsed from the text files
+	parse = "import mime.xdg.snapshot as s; s.ENABLED = False; import mime; mime.preload()"
+	snapshot = "import mime; mime.preload()"
+	# Write the snapshot the second case reads
+	spawn(snapshot, env, 1)
+	return {
+		"import/lazy": summarize(spawn("import mime", env, runs)),
+		"import/preload-parse": summarize(spawn(parse, env, runs)),
+		"import/preload-snapshot": summarize(spawn(snapshot, env, runs)),
+	}
+
+def benchParse(root, env, runs):
+	from mime.xdg.actions import CacheFile
+	from mime.xdg.mime import GlobsFile, MagicFile
+	base = os.path.join(root, "share")
+	ret = {}
+	for name, cls, path in (
+		("parse/globs2", GlobsFile, "mime/globs2"),
+		("parse/magic", MagicFile, "mime/magic"),
+		("parse/mimeinfo.cache", CacheFile, "applications/mimeinfo.cache"),
+	):
+		path = os.path.join(base, path)
+		ret[name] = summarize(measure(lambda: cls().parse(path), runs))
+	return ret
+
+def benchNames(root, env, runs, types, seed):
+	from mime import MimeType
+	from mime.xdg.mime import GLOBS
+	GLOBS.load()
+	ret = {}
+	for name, names in sorted(tree.corpora(types, seed).items()):
+		def run():
+			for filename in names:
+				MimeType.fromName(filename)
+		ret["fromName/" + name] = summarize(measure(run, runs), len(names))
+	return ret
+
+def benchContent(root, env, runs):
+	from mime import MimeType
+	from mime.xdg.mime import MAGIC
+	MAGIC.load()
+	base = os.path.join(root, "files")
+	paths = [os.path.join(base, name) for name in sorted(os.listdir(base))]
+	def run():
+		for path in paths:
+			MimeType.fromContent(path)
+	return {"fromContent": summarize(measure(run, runs), len(paths))}
+
+def benchMetadata(root, env, runs, types):
+	from mime import MimeType
+	from mime.xdg.mime import METADATA
+	mimes = [MimeType(tree.typeName(i)) for i in range(types)]
+	def run():
+		for mime in mimes:
+			mime.comment()
+	return {
+		"comment/cold": summarize(measure(run, runs, METADATA.reload), len(mimes)),
+		"comment/warm": summarize(measure(run, runs), len(mimes)),
+	}
+
+def benchActions(root, env, runs, types):
+	from mime import MimeType
+	from mime.xdg import actions, xdg
+	mimes = [MimeType(tree.typeName(i)) for i in range(types)]
+	for table in (xdg.DESKTOP_FILES, actions.ACTIONS, actions.CACHE):
+		table.load()
+	def run():
+		for mime in mimes:
+			mime.bestApplication()
+	return {
+		"bestApplication/cold": summarize(measure(run, runs, actions.RESOLVER.reload), len(mimes)),
+		"bestApplication/warm": summarize(measure(run, runs), len(mimes)),
+	}
+
+
+def compare(old, new):
+	print("%-28s %12s %12s %8s" % ("benchmark", "before (us)", "after (us)", "ratio"))
+	for name in sorted(new["results"]):
+		after = new["results"][name]["per_op_us"]
+		if name not in old["results"]:
+			print("%-28s %12s %12.2f" % (name, "-", after))
+			continue
+		before = old["results"][name]["per_op_us"]
+		print("%-28s %12.2f %12.2f %7.2fx" % (name, before, after, before and after / before or 0))
+
+def main():
+	from optparse import OptionParser
+	parser = OptionParser()
+	parser.add_option("-n", "--runs", type="int", default=10, help="runs per benchmark")
+	parser.add_option("-t", "--types", type="int", default=1000, help="MIME types in the generated tree")
+	parser.add_option("-s", "--seed", type="int", default=0)
+	parser.add_option("-o", "--output", help="write the results to OUTPUT rather than stdout")
+	parser.add_option("-c", "--compare", metavar="JSON", help="print the ratios against earlier results")
+	parser.add_option("-k", "--keep", metavar="DIR", help="generate the tree in DIR and keep it")
+	options, args = parser.parse_args()
+
+	root = options.keep or tempfile.mkdtemp(prefix="mime-bench-")
+	try:
+		tree.generate(root, options.types, options.seed)
+		env = tree.environ(root)
+		# Before the library is imported, it reads them once
+		os.environ.update(env)
+		import mime.xdg.snapshot
+		mime.xdg.snapshot.ENABLED = False
+
+		runs = options.runs
+		results = {}
+		results.update(benchImport(root, env, runs))
+		results.update(benchParse(root, env, runs))
+		results.update(benchNames(root, env, runs, options.types, options.seed))
+		results.update(benchContent(root, env, runs))
+		results.update(benchMetadata(root, env, runs, options.types))
+		results.update(benchActions(root, env, runs, options.types))
+	finally:
+		if not options.keep:
+			shutil.rmtree(root)
+
+	report = {
+		"version": VERSION,
+		"python": platform.python_version(),
+		"implementation": platform.python_implementation(),
+		"machine": platform.machine(),
+		"tree": {"types": options.types, "seed": options.seed},
+		"runs": options.runs,
+		"results": results,
+	}
+	data = json.dumps(report, indent=1, sort_keys=True)
+	if options.output:
+		with open(options.output, "w") as file:
+			file.write(data + "\n")
+	else:
+		print(data)
+
+	if options.compare:
+		with open(options.compare) as file:
+			compare(json.load(file), report)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+"""
+Synthetic XDG data tree
+
+Generates a MIME database, desktop files and sample files from a seed, so
+that benchmarks don't depend on the shared-mime-info of the host. Only the
+text files are written, never mime.cache: nothing needs to be installed.
+
+	python benchmarks/tree.py [-t TYPES] [-s SEED] ROOT
+"""
+
+import os
+import random
+import struct
+
+FREEDESKTOP_NS = "http://www.freedesktop.org/standards/shared-mime-info"
+
+
+def typeName(i):
+	return "application/x-bench-%04i" % (i)
+
+def magicValue(i):
+	return ("BN%06i" % (i)).encode("ascii")
+
+def appName(i):
+	return "bench-app-%03i.desktop" % (i)
+
+
+def write(path, data, mode="w"):
+	base = os.path.dirname(path)
+	if not os.path.exists(base):
+		os.makedirs(base)
+	with open(path, mode) as file:
+		file.write(data)
+
+def writeMime(base, types, files=True):
+	globs = ["# Generated by benchmarks/tree.py"]
+	magic = [b"MIME-Magic\0\n"]
+	aliases = []
+	subclasses = []
+	icons = []
+	package = ['<?xml version="1.0" encoding="UTF-8"?>', '<mime-info xmlns="%s">' % (FREEDESKTOP_NS)]
+
+	for i in range(types):
+		mime = typeName(i)
+		globs.append("50:%s:*.bn%04i" % (mime, i))
+		if i % 10 == 0:
+			globs.append("60:%s:BENCH%04i" % (mime, i))
+		if i % 25 == 0:
+			globs.append("50:%s:bench-%04i-*.log" % (mime, i))
+		if i % 7 == 0:
+			globs.append("50:%s:*.Cs%04i:cs" % (mime, i))
+
+		if i % 2 == 0:
+			value = magicValue(i)
+			magic.append(("[50:%s]\n" % (mime)).encode("ascii"))
+			if i % 6 == 0:
+				# Anywhere in the first 256 bytes after 16
+				rule = b">16=" + struct.pack(">H", len(value)) + value + b"+256\n"
+			elif i % 22 == 0:
+				rule = b">0=" + struct.pack(">H", len(value)) + value + b"&" + b"\xff" * (len(value) - 1) + b"\xdf\n"
+			else:
+				rule = b">0=" + struct.pack(">H", len(value)) + value + b"\n"
+			magic.append(rule)
+
+		if i % 20 == 0:
+			aliases.append("application/x-bench-alias-%04i %s" % (i, mime))
+		if i % 10:
+			subclasses.append("%s %s" % (mime, typeName(i - 1)))
+		icons.append("%s:package-x-generic" % (mime))
+
+		comment = "Benchmark document %i" % (i)
+		package.append('<mime-type type="%s"><comment>%s</comment><comment xml:lang="fr">Document %i</comment></mime-type>' % (mime, comment, i))
+		if files:
+			write(os.path.join(base, "application", "x-bench-%04i.xml" % (i)),
+				'<?xml version="1.0" encoding="UTF-8"?>\n<mime-type xmlns="%s" type="%s"><comment>%s</comment></mime-type>\n' % (FREEDESKTOP_NS, mime, comment))
+
+	package.append("</mime-info>")
+	write(os.path.join(base, "globs2"), "\n".join(globs) + "\n")
+	write(os.path.join(base, "magic"), b"".join(magic), "wb")
+	write(os.path.join(base, "aliases"), "\n".join(aliases) + "\n")
+	write(os.path.join(base, "subclasses"), "\n".join(subclasses) + "\n")
+	write(os.path.join(base, "generic-icons"), "\n".join(icons) + "\n")
+	write(os.path.join(base, "packages", "bench.xml"), "\n".join(package) + "\n")
+
+def writeApplications(base, types, rng):
+	apps = max(types // 4, 1)
+	handled = dict((i, []) for i in range(apps))
+	cache = ["[MIME Cache]"]
+	for i in range(types):
+		choices = rng.sample(range(apps), min(3, apps))
+		for app in choices:
+			handled[app].append(typeName(i))
+		cache.append("%s=%s;" % (typeName(i), ";".join(appName(app) for app in choices)))
+
+	for app, mimes in handled.items():
+		write(os.path.join(base, appName(app)),
+			"[Desktop Entry]\nType=Application\nName=Bench %i\nExec=bench %%f\nMimeType=%s;\n" % (app, ";".join(mimes)))
+
+	defaults = ["[Default Applications]"]
+	added = ["[Added Associations]"]
+	removed = ["[Removed Associations]"]
+	for i in range(types):
+		if i % 3 == 0:
+			defaults.append("%s=%s" % (typeName(i), appName(rng.randrange(apps))))
+		if i % 5 == 0:
+			added.append("%s=%s;" % (typeName(i), appName(rng.randrange(apps))))
+		if i % 11 == 0:
+			removed.append("%s=%s;" % (typeName(i), appName(rng.randrange(apps))))
+
+	write(os.path.join(base, "mimeinfo.cache"), "\n".join(cache) + "\n")
+	write(os.path.join(base, "mimeapps.list"), "\n".join(defaults + [""] + added + [""] + removed) + "\n")
+
+def writeFiles(base, types, rng):
+	"""
+	Sample files without extension, so that they can only be sniffed
+	"""
+	for i in range(0, types, 2):
+		data = bytearray(rng.getrandbits(8) for _ in range(512))
+		value = magicValue(i)
+		offset = i % 6 == 0 and 16 + rng.randrange(256) or 0
+		data[offset:offset + len(value)] = value
+		write(os.path.join(base, "magic-%04i" % (i)), bytes(data), "wb")
+
+	for i in range(types // 10):
+		write(os.path.join(base, "text-%04i" % (i)), "Plain text %i\n" % (i) * 20)
+
+def generate(root, types=1000, seed=0, files=True):
+	"""
+	Write the tree under root. Its share/ directory is meant to be the only
+	entry of XDG_DATA_DIRS, see environ(). Unless files is True, neither the
+	per-type XML files nor the sample files are written.
+	"""
+	rng = random.Random(seed)
+	writeMime(os.path.join(root, "share", "mime"), types, files)
+	writeApplications(os.path.join(root, "share", "applications"), types, rng)
+	if files:
+		writeFiles(os.path.join(root, "files"), types, rng)
+	for name in ("home", "cache"):
+		path = os.path.join(root, name)
+		if not os.path.exists(path):
+			os.makedirs(path)
+
+def environ(root):
+	"""
+	Returns the environment variables pointing the library at the tree
+	"""
+	return {
+		"XDG_DATA_HOME": os.path.join(root, "home"),
+		"XDG_DATA_DIRS": os.path.join(root, "share"),
+		"XDG_CACHE_HOME": os.path.join(root, "cache"),
+	}
+
+def corpora(types=1000, seed=0, size=5000):
+	"""
+	Returns lists of file names by what they exercise in the glob tables
+	"""
+	rng = random.Random(seed)
+	def pick(step=1):
+		return rng.randrange(0, types, step)
+
+	ret = {
+		"hit": ["report-%i.bn%04i" % (n, pick()) for n in range(size)],
+		"casefold": ["REPORT-%i.BN%04i" % (n, pick()) for n in range(size)],
+		"fnmatch": ["bench-%04i-%i.log" % (pick(25), n) for n in range(size)],
+		"miss": ["notes-%i.unknown%i" % (n, n % 97) for n in range(size)],
+	}
+	mixed = []
+	for n in range(size):
+		mixed.append(rng.choice(ret[rng.choice(("hit", "hit", "hit", "casefold", "fnmatch", "miss"))]))
+	ret["mixed"] = mixed
+	return ret
+
+
+def main():
+	from optparse import OptionParser
+	parser = OptionParser(usage="%prog [options] ROOT")
+	parser.add_option("-t", "--types", type="int", default=1000, help="MIME types to generate")
+	parser.add_option("-s", "--seed", type="int", default=0)
+	options, args = parser.parse_args()
+	if len(args) != 1:
+		parser.error("ROOT is required")
+
+	generate(args[0], options.types, options.seed)
+	for name, value in sorted(environ(args[0]).items()):
+		print("%s=%s" % (name, value))
+
+if __name__ == "__main__":
+	main()
@@ -1,6 +1,9 @@
 import sys
+from .statistics import stats
 
 if sys.platform == "win32":
-	from .windows.mime import MimeType
+	from .windows.windows import MimeType, preload, refresh
 else:
-	from .xdg.mime import MimeType
+	from .xdg.mime import MimeType, preload
+	from .xdg.database import DATABASE, refresh
+	from .xdg.scan import scan
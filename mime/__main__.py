@@ -0,0 +1,94 @@
+"""
+Command-line classifier
+
+Prints the MIME type of every path given as argument or, without any, read
+from stdin, one per line or NUL-separated with -0. Records end with a
+newline, or with -0 or -z with a NUL: since types never hold tabs, the
+path is everything before the last tab.
+
+	python -m mime setup.py README
+	find . -print0 | python -m mime -0 --jobs 4 --format json
+"""
+
+import json
+import os
+import sys
+from . import bulk
+
+MODES = {
+	"path": bulk.BY_PATH,
+	"content": bulk.BY_CONTENT,
+	"name": bulk.BY_NAME,
+}
+
+# Bytes read from stdin at once
+READ_SIZE = 1 << 16
+
+
+def readPaths(file, separator):
+	"""
+	Yield the paths in file, a binary stream, as they are read
+	"""
+	pending = b""
+	while True:
+		data = file.read(READ_SIZE)
+		if not data:
+			break
+		paths = (pending + data).split(separator)
+		pending = paths.pop()
+		for path in paths:
+			if path:
+				yield os.fsdecode(path)
+	if pending.strip(b"\n"):
+		yield os.fsdecode(pending)
+
+def formatTSV(path, mime, terminator=b"\n"):
+	return os.fsencode(path) + b"\t" + (mime or "").encode("ascii") + terminator
+
+def formatJSON(path, mime, terminator=b"\n"):
+	return json.dumps({"path": path, "type": mime}).encode("ascii") + terminator
+
+def main(argv=None):
+	from optparse import OptionParser
+	parser = OptionParser(usage="%prog [options] [PATH...]")
+	parser.add_option("-0", "--null", action="store_true", help="read NUL-separated paths from stdin, as find -print0 writes them, and end records with a NUL")
+	parser.add_option("-z", "--zero-terminated", action="store_true", help="end records with a NUL rather than a newline")
+	parser.add_option("-m", "--mode", type="choice", choices=sorted(MODES), default="path",
+		help="classify by name only, by content only, or by path: by name, falling back to the content when the name is ambiguous (the default)")
+	parser.add_option("-f", "--format", type="choice", choices=("tsv", "json"), default="tsv", help="print tab-separated path and type lines (the default), or JSON objects")
+	parser.add_option("-j", "--jobs", type="int", default=1, help="classify in JOBS worker processes")
+	parser.add_option("-u", "--unordered", action="store_true", help="print results as soon as they are ready, with --jobs, and flush them right away")
+	options, args = parser.parse_args(argv)
+
+	if args:
+		paths = iter(args)
+	else:
+		paths = readPaths(sys.stdin.buffer, options.null and b"\0" or b"\n")
+
+	# Remember the paths until their result comes back
+	pending = {}
+	def track(paths):
+		for i, path in enumerate(paths):
+			pending[i] = path
+			yield path
+
+	format = options.format == "json" and formatJSON or formatTSV
+	terminator = (options.null or options.zero_terminated) and b"\0" or b"\n"
+	out = sys.stdout.buffer
+	results = bulk.classify(track(paths), processes=options.jobs, ordered=not options.unordered, by=MODES[options.mode])
+	try:
+		for i, mime in results:
+			out.write(format(pending.pop(i), mime, terminator))
+			if options.unordered:
+				out.flush()
+		out.flush()
+	except BrokenPipeError:
+		# The reader went away, as head does
+		results.close()
+		sys.stderr.close()
+		return 1
+
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
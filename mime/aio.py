@@ -0,0 +1,151 @@
+"""
+asyncio API
+
+Coroutines classifying files without blocking the event loop: name and glob
+matching run inline, while stat calls, reads and the first load of the
+database tables run in a bounded thread pool. Requires the xdg
+implementation.
+"""
+
+import asyncio
+import os
+import stat
+from .xdg.mime import ANCESTORS, GLOBS, MAGIC, MimeType, sniffExtent
+from .xdg.scan import classify, listDirectory
+
+# Threads doing file I/O for the coroutines of this module
+WORKERS = 8
+
+_executor = None
+
+def getExecutor():
+	global _executor
+	if _executor is None:
+		from concurrent.futures import ThreadPoolExecutor
+		_executor = ThreadPoolExecutor(WORKERS)
+	return _executor
+
+def setExecutor(executor):
+	"""
+	Run the file I/O of this module in executor rather than in a pool of
+	WORKERS threads
+	"""
+	global _executor
+	_executor = executor
+
+def _run(func, *args):
+	return asyncio.get_running_loop().run_in_executor(getExecutor(), func, *args)
+
+async def _load(*tables):
+	# Parsing the database would stall the event loop
+	for table in tables:
+		if not table.isLoaded():
+			await _run(table.load)
+
+
+async def fromContent(path):
+	"""
+	Like MimeType.fromContent
+	"""
+	return await _run(MimeType.fromContent, path)
+
+async def fromPath(path):
+	"""
+	Like MimeType.fromPath. The file is only read when its name is not
+	enough.
+	"""
+	try:
+		st = await _run(os.stat, path)
+	except OSError:
+		return
+
+	if not stat.S_ISREG(st.st_mode):
+		# Directories may need more stat calls, to tell mount points
+		return await _run(MimeType.fromMode, path, st.st_mode)
+
+	await _load(GLOBS)
+	globs = GLOBS.matchAll(os.path.basename(path))
+	if len(globs) == 1:
+		return MimeType(globs[0])
+
+	return await _run(MimeType._fromGlobs, path, st.st_size, globs)
+
+async def fromStreamReader(reader, name=None):
+	"""
+	Classify the data an asyncio.StreamReader yields, and optionally its
+	name, without spooling it anywhere. At most sniffExtent() bytes are
+	read, and none if the name is enough.
+	Returns a (MimeType, data) tuple, data being the bytes read from reader,
+	so that they can be handed over along with the rest of the stream.
+	"""
+	await _load(GLOBS, MAGIC, ANCESTORS)
+	globs = name and GLOBS.matchAll(name) or []
+	if len(globs) == 1:
+		return MimeType(globs[0]), b""
+
+	chunks = []
+	remaining = sniffExtent()
+	while remaining > 0:
+		chunk = await reader.read(remaining)
+		if not chunk:
+			break
+		chunks.append(chunk)
+		remaining -= len(chunk)
+
+	data = b"".join(chunks)
+	if not data:
+		return MimeType._combine(MimeType(MimeType.ZERO_SIZE), globs), data
+	return MimeType._combine(MimeType._fromData(data), globs), data
+
+async def scan(root, content=True, limit=WORKERS):
+	"""
+	Asynchronous iterator over the (path, MimeType) tuples of every entry
+	in the tree under root, like mime.scan. Directories are listed in the
+	executor and classified inline; at most limit files are sniffed at
+	once.
+	"""
+	semaphore = asyncio.Semaphore(limit)
+	matches = {}
+	pending = set()
+
+	async def sniff(path, size, globs):
+		async with semaphore:
+			return path, await _run(MimeType._fromGlobs, path, size, globs)
+
+	try:
+		device = (await _run(os.stat, root)).st_dev
+	except OSError:
+		return
+	await _load(GLOBS)
+
+	dirs = [root]
+	try:
+		while dirs:
+			for path, name, st, isSymlink in await _run(listDirectory, dirs.pop()):
+				mime, descend, globs = classify(path, name, st, isSymlink, device, matches, content)
+				if descend:
+					dirs.append(path)
+
+				if globs is None:
+					yield path, mime
+					continue
+
+				pending.add(asyncio.ensure_future(sniff(path, st.st_size, globs)))
+				if len(pending) >= limit * 4:
+					done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+					for task in done:
+						yield task.result()
+
+			# Hand over whatever is ready between directories
+			for task in [task for task in pending if task.done()]:
+				pending.remove(task)
+				yield task.result()
+
+		while pending:
+			done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+			for task in done:
+				yield task.result()
+	finally:
+		# The caller stopped early
+		for task in pending:
+			task.cancel()
@@ -3,39 +3,84 @@ Base MimeType class
 """
 
 import os
+import weakref
 
 class BaseMime(object):
+	"""
+	MIME types are flyweights: there is a single, immutable instance per
+	class and name, created on first use and shared for as long as it is
+	referenced, so that names from untrusted input don't pile up.
+	"""
+	__slots__ = ("_name", "_type", "_subtype", "_icon", "__weakref__")
+
 	DEFAULT_TEXT = "text/plain"
 	DEFAULT_BINARY = "application/octet-stream"
 	SCHEME_FORMAT = "x-scheme-handler/%s"
 	ZERO_SIZE = "application/x-zerosize"
 
-	def __init__(self, mime):
-		self.__name = str(mime)
-		self._aliases = []
-		self._comment = {}
+	_instances = weakref.WeakValueDictionary()
+
+	def __new__(cls, mime):
+		self = cls._instances.get((cls, mime))
+		if self is None:
+			name = str(mime)
+			self = cls._instances.get((cls, name))
+			if self is None:
+				self = super(BaseMime, cls).__new__(cls)
+				self._name = name
+				self._type, _, self._subtype = name.partition("/")
+				self._icon = name.replace("/", "-")
+				# Another thread may have won the race
+				self = cls._instances.setdefault((cls, name), self)
+		return self
+
+	def __copy__(self):
+		return self
+
+	def __deepcopy__(self, memo):
+		return self
+
+	def __reduce__(self):
+		return (self.__class__, (self._name, ))
 
 	def __eq__(self, other):
 		if isinstance(other, BaseMime):
-			return self.name() == other.name()
-		return self.name() == other
+			return self._name == other._name
+		return self._name == other
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		# Equal to their name, so they must hash like it
+		return hash(self._name)
 
 	def __str__(self):
-		return str(self.name())
+		return self._name
 
 	def __repr__(self):
-		return "<MimeType: %s>" % (self.name())
+		return "<MimeType: %s>" % (self._name)
 
 	@classmethod
 	def fromInode(cls, name):
-		import stat
 		try:
 			mode = os.stat(name).st_mode
 		except IOError:
 			return
 
-		# Test for mount point before testing for inode/directory
-		if os.path.ismount(name):
+		return cls.fromMode(name, mode)
+
+	@classmethod
+	def fromMode(cls, name, mode):
+		"""
+		Like fromInode, with the st_mode of name already at hand
+		"""
+		import stat
+
+		# Test for mount point before testing for inode/directory.
+		# Only directories are, short of bind mounts, so that files don't pay
+		# for the extra stat calls.
+		if stat.S_ISDIR(mode) and os.path.ismount(name):
 			return cls("inode/mount-point")
 
 		if stat.S_ISBLK(mode):
@@ -76,20 +121,20 @@ class BaseMime(object):
 		return self.__class__("%s/x-generic" % (self.type()))
 
 	def icon(self):
-		return self.name().replace("/", "-")
+		return self._icon
 
 	def isDefault(self):
-		name = self.name()
-		return name == DEFAULT_BINARY or name == DEFAULT_TEXT
+		name = self._name
+		return name == self.DEFAULT_BINARY or name == self.DEFAULT_TEXT
 
 	def isInstance(self, other):
 		return self == other or other in self.subClassOf()
 
 	def name(self):
-		return self.__name
+		return self._name
 
 	def subtype(self):
-		return self.name().split("/")[1]
+		return self._subtype
 
 	def type(self):
-		return self.name().split("/")[0]
+		return self._type
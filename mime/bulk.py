@@ -0,0 +1,132 @@
+"""
+Classification of many files in a pool of processes
+
+Magic sniffing is CPU-bound and holds the GIL, so threads don't help once
+files are in the page cache. classify() hands chunks of paths to worker
+processes instead. Requires the xdg implementation.
+"""
+
+import os
+from .xdg.mime import ALIASES, GLOBS, MAGIC, SUBCLASSES, MimeType
+
+# Paths handed to a worker at once
+CHUNKSIZE = 256
+
+# Chunks queued per worker: enough to keep them busy, and paths are only
+# read from the iterable as fast as they are classified
+BACKLOG = 2
+
+# How classify() can classify each path
+BY_PATH = "path"
+BY_CONTENT = "content"
+BY_NAME = "name"
+
+_by = BY_PATH
+_content = True
+
+
+def _initWorker(by, content):
+	"""
+	Load the tables classification needs once per worker, not the
+	applications preload() also reads: forked workers inherit the tables
+	the parent loaded, others map the caches or read the snapshot.
+	"""
+	global _by, _content
+	_by = by
+	_content = content
+	for table in (ALIASES, GLOBS, MAGIC, SUBCLASSES):
+		table.load()
+
+def _classifyChunk(chunk):
+	start, paths = chunk
+	if _by == BY_CONTENT:
+		mimes = [MimeType.fromContent(path) for path in paths]
+	elif _by == BY_NAME:
+		mimes = MimeType.fromNames([os.path.basename(path) for path in paths])
+	else:
+		mimes = MimeType.fromPaths(paths, _content)
+
+	ret = []
+	for i, mime in enumerate(mimes):
+		ret.append((start + i, mime and mime.name()))
+	return ret
+
+def _chunks(paths, chunksize):
+	chunk = []
+	start = 0
+	for path in paths:
+		chunk.append(path)
+		if len(chunk) == chunksize:
+			yield start, chunk
+			start += chunksize
+			chunk = []
+	if chunk:
+		yield start, chunk
+
+def classify(paths, processes=None, chunksize=CHUNKSIZE, ordered=True, content=True, by=BY_PATH):
+	"""
+	Classify every path in paths like MimeType.fromPath, in processes
+	worker processes (one per CPU by default). Yields (index, name)
+	tuples, index being the position of the path in paths and name that of
+	its MIME type, or None. Results come in the order of paths if ordered
+	is True, otherwise as soon as their chunk is done.
+	paths can be any iterable, and is consumed as workers need more: at
+	most BACKLOG chunks per worker are read ahead of the results.
+	With by set to BY_CONTENT or BY_NAME, paths are classified like
+	MimeType.fromContent, or MimeType.fromName on their base name, instead.
+	"""
+	from multiprocessing import Pool, cpu_count
+	if processes is None:
+		processes = cpu_count()
+
+	if processes <= 1:
+		_initWorker(by, content)
+		for chunk in _chunks(paths, chunksize):
+			for result in _classifyChunk(chunk):
+				yield result
+		return
+
+	pool = Pool(processes, _initWorker, (by, content))
+	try:
+		for results in _submit(pool, _chunks(paths, chunksize), processes * BACKLOG, ordered):
+			for result in results:
+				yield result
+		pool.close()
+	finally:
+		# Also stops the workers if the caller gave up early
+		pool.terminate()
+		pool.join()
+
+def _submit(pool, chunks, window, ordered):
+	"""
+	Hand chunks over to pool, keeping at most window of them queued or
+	running, and yield their results. Unlike Pool.imap, whose feeder thread
+	drains chunks as fast as it can, the next chunk is only taken once a
+	result came back.
+	"""
+	from collections import deque
+	from queue import Queue
+	pending = deque()
+	done = Queue()
+	running = 0
+	for chunk in chunks:
+		if ordered:
+			pending.append(pool.apply_async(_classifyChunk, (chunk, )))
+		else:
+			pool.apply_async(_classifyChunk, (chunk, ), callback=done.put, error_callback=done.put)
+		running += 1
+		if running >= window:
+			running -= 1
+			yield _next(pending, done, ordered)
+
+	while running:
+		running -= 1
+		yield _next(pending, done, ordered)
+
+def _next(pending, done, ordered):
+	if ordered:
+		return pending.popleft().get()
+	ret = done.get()
+	if isinstance(ret, BaseException):
+		raise ret
+	return ret
@@ -0,0 +1,112 @@
+"""
+Opt-in statistics on lookups and database loading
+
+Disabled by default: instrumented code only tests ENABLED, and records
+nothing. Once enabled, events are counted and timed in memory, see stats(),
+and handed to every hook added with addHook, for export to other metrics
+systems.
+
+Counters:
+	globs.<tier>: name lookups each glob tier answered (literal, extension,
+		pattern, or their folded- variants matching the lowercased name)
+	globs.miss: name lookups no glob matched
+	sniff.files, sniff.bytes: data sniffed, and its size
+	sniff.magic, sniff.text, sniff.binary: what the sniffed data turned out
+		to be, by magic rule or by fallback
+	metadata.hit, metadata.miss: comment() and friends finding the type
+		already parsed, or having to read its XML
+	metadata.files: XML files parsed
+	snapshot.hit, snapshot.miss: tables read from the snapshot, or built
+	applications.hit, applications.miss: bestApplication memoized, or
+		resolved
+	names.*, contents.*: the result caches of fromName and fromContent,
+		see xdg.LRUCache
+Timings:
+	load.<path>: parsing each database file, or opening each cache
+	load.snapshot: reading the snapshot
+"""
+
+import threading
+import time
+
+ENABLED = False
+
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+_hooks = []
+
+
+def enable():
+	global ENABLED
+	ENABLED = True
+
+def disable():
+	global ENABLED
+	ENABLED = False
+
+def reset():
+	with _lock:
+		_counters.clear()
+		_timings.clear()
+
+def addHook(hook):
+	"""
+	Call hook(kind, name, value) for every event recorded from now on, kind
+	being "count" or "timing" and value a count or seconds
+	"""
+	_hooks.append(hook)
+
+def removeHook(hook):
+	_hooks.remove(hook)
+
+
+def count(name, n=1):
+	with _lock:
+		_counters[name] = _counters.get(name, 0) + n
+	for hook in _hooks:
+		hook("count", name, n)
+
+def clock():
+	"""
+	Returns the start time to hand over to timing, or None if disabled
+	"""
+	if ENABLED:
+		return time.time()
+
+def timing(name, start):
+	"""
+	Record the time elapsed since start, as returned by clock()
+	"""
+	if start is None:
+		return
+	elapsed = time.time() - start
+	with _lock:
+		calls, total, longest = _timings.get(name, (0, 0.0, 0.0))
+		_timings[name] = (calls + 1, total + elapsed, max(longest, elapsed))
+	for hook in _hooks:
+		hook("timing", name, elapsed)
+
+
+def stats():
+	"""
+	Returns what was recorded since statistics were enabled or reset: the
+	counters, the timings as calls, total and longest seconds, and the hit
+	ratio of every counter pair named <prefix>.hit and <prefix>.miss
+	"""
+	with _lock:
+		counters = dict(_counters)
+		timings = dict((name, {"calls": calls, "total": total, "max": longest}) for name, (calls, total, longest) in _timings.items())
+
+	ratios = {}
+	for name, hits in counters.items():
+		if name.endswith(".hit"):
+			prefix = name[:-len(".hit")]
+			ratios[prefix] = float(hits) / (hits + counters.get(prefix + ".miss", 0))
+
+	return {
+		"enabled": ENABLED,
+		"counters": counters,
+		"timings": timings,
+		"ratios": ratios,
+	}
@@ -10,10 +10,28 @@ except ImportError:
 	from _winreg import HKEY_CLASSES_ROOT, OpenKey, QueryValueEx
 from ..basemime import BaseMime
 
+# Registry key holding the description of each MIME type, by name, as found
+# by fromName. Instances are shared, so it can't be kept on them.
+_handleKeys = {}
+
+def preload():
+	"""
+	The registry is queried on demand, there is nothing to load
+	"""
+
+def refresh():
+	"""
+	Nor anything to reload
+	"""
+	return []
+
 class MimeType(BaseMime):
 	"""
 	Windows Registry-based MimeType
 	"""
+	# The description, set on first use
+	__slots__ = ("_comment", )
+
 	@classmethod
 	def fromName(cls, name):
 		root, ext = splitext(name.lower())
@@ -25,19 +43,25 @@ class MimeType(BaseMime):
 			with OpenKey(HKEY_CLASSES_ROOT, ext) as key:
 				try:
 					mime, _ = QueryValueEx(key, "Content Type")
-					instance = cls(mime)
 				except WindowsError:
-					instance = cls("application/x-windows-extension-%s" % (ext[1:]))
-				instance.__handlekey, _ = QueryValueEx(key, "") # (Default)
-				return instance
+					mime = "application/x-windows-extension-%s" % (ext[1:])
+				_handleKeys[mime], _ = QueryValueEx(key, "") # (Default)
+				return cls(mime)
 		except WindowsError:
 			pass
 
 	def comment(self, lang="en"):
-		if self._comment is None:
-			with OpenKey(HKEY_CLASSES_ROOT, self.__handlekey) as key:
-				self._comment, _ = QueryValueEx(key, "") # (Default)
+		# The registry only has one description, whatever the language
+		try:
+			return self._comment
+		except AttributeError:
+			pass
 
+		handleKey = _handleKeys.get(self._name)
+		if handleKey is None:
+			return
+		with OpenKey(HKEY_CLASSES_ROOT, handleKey) as key:
+			self._comment, _ = QueryValueEx(key, "") # (Default)
 		return self._comment
 
 	def parent(self):
@@ -4,6 +4,12 @@ http://www.freedesktop.org/wiki/Specifications/mime-actions-spec
 """
 
 from . import xdg
+from .. import statistics
+
+try:
+	intern
+except NameError:
+	from sys import intern
 
 ADDED_ASSOCIATIONS = "Added Associations"
 REMOVED_ASSOCIATIONS = "Removed Associations"
@@ -63,77 +69,136 @@ class ActionsFile(xdg.IniFile):
 	def defaultApplication(self, mime):
 		return self.keys[DEFAULT_APPLICATIONS].get(mime)
 
-ACTIONS = ActionsFile()
-for f in xdg.getFiles("applications/mimeapps.list"):
-	ACTIONS.parse(f)
+def _loadTable(cls, name, trees=()):
+	from .snapshot import SNAPSHOT
+
+	def build():
+		# Least important first, so that the others override it
+		ret = cls()
+		for f in reversed(xdg.getFiles(name)):
+			start = statistics.clock()
+			ret.parse(f)
+			statistics.timing("load." + f, start)
+		return ret
+
+	return SNAPSHOT.get(name, build, trees)
+
+# Default applications are only kept if their desktop file exists
+ACTIONS = xdg.LazyTable(_loadTable, ActionsFile, "applications/mimeapps.list", ("applications", ))
 
 
 class CacheFile(xdg.IniFile):
 	"""
 	applications/mimeinfo.cache
 	Not part of the spec, but generated by desktop-file-utils
+
+	The file lists every type some application handles, so it is read line
+	by line rather than through RawConfigParser, interning the types and
+	desktop file IDs shared between lines.
 	"""
 
-	def parseKeys(self):
-		for mime, apps in self.cfg.items("MIME Cache"):
-			if mime not in self.keys:
-				self.keys[mime] = []
+	SECTION = "MIME Cache"
 
-			assert apps.endswith(";"), apps
-			apps = apps.split(";")
-			for app in apps:
-				if not app:
-					# We either got two semicolons in a row
-					# or we got the last semicolon
+	def parse(self, path):
+		keys = self.keys
+		section = None
+		with open(path, "r") as file:
+			for line in file:
+				line = line.strip()
+				if not line or line[0] in "#;":
 					continue
-				self.keys[mime].insert(0, app)
 
-	def associationsFor(self, mime, exclude=[]):
+				if line[0] == "[":
+					section = line[1:line.find("]")]
+					continue
+
+				if section != self.SECTION:
+					continue
+
+				mime, sep, apps = line.partition("=")
+				if not sep:
+					continue
+
+				# Like RawConfigParser, which lowercases keys
+				mime = intern(mime.strip().lower())
+				# Each line is listed last application first, before the
+				# ones of the files parsed earlier
+				apps = [intern(app) for app in reversed(apps.strip().split(";")) if app]
+				previous = keys.get(mime)
+				if previous:
+					apps += previous
+				keys[mime] = apps
+
+	def associationsFor(self, mime, exclude=()):
 		if mime in self.keys:
+			exclude = set(exclude)
 			return [app for app in self.keys[mime] if app not in exclude]
 		return []
 
-CACHE = CacheFile()
-for f in xdg.getFiles("applications/mimeinfo.cache"):
-	CACHE.parse(f)
+CACHE = xdg.LazyTable(_loadTable, CacheFile, "applications/mimeinfo.cache")
 
 
-def defaultApplication(mime):
-	return ACTIONS.defaultApplication(mime)
-
-def bestApplication(mime):
-	# First, check if the default app is defined
-	ret = ACTIONS.defaultApplication(mime)
-	if ret:
+class Resolver(object):
+	"""
+	The effective handlers of every MIME type, merged once per type from
+	the actions and cache tables: the default application, then the added
+	associations, then the cached ones that weren't removed.
+	Types without any fall back to their nearest ancestor with some.
+	"""
+	def __init__(self):
+		self._associations = {}
+		self._best = {}
+
+	def associations(self, mime):
+		ret = self._associations.get(mime)
+		if ret is None:
+			apps = []
+			default = ACTIONS.defaultApplication(mime)
+			if default:
+				apps.append(default)
+			apps += ACTIONS.addedAssociations(mime)
+			apps += CACHE.associationsFor(mime, exclude=ACTIONS.removedAssociations(mime))
+
+			# Keep the first occurrence of every application
+			ret = []
+			seen = set()
+			for app in apps:
+				if app not in seen:
+					seen.add(app)
+					ret.append(app)
+			ret = self._associations[mime] = tuple(ret)
 		return ret
 
-	# Then, check the added associations (they have priority)
-	ret = ACTIONS.addedAssociations(mime)
-	if ret:
-		return ret[0]
-
-	# Finally, check the cached associations
-	ret = CACHE.associationsFor(mime, exclude=ACTIONS.removedAssociations(mime))
-	if ret:
-		return ret[0]
-
-	# If we still don't have anything, try the mime's parents one by one
-	from .mime import MimeType
-	for mime in MimeType(mime).subClassOf():
-		ret = bestApplication(mime.name())
-		if ret:
+	def bestApplication(self, mime):
+		try:
+			ret = self._best[mime]
+		except KeyError:
+			if statistics.ENABLED:
+				statistics.count("applications.miss")
+		else:
+			if statistics.ENABLED:
+				statistics.count("applications.hit")
 			return ret
 
-	# No application found
+		ret = self.associations(mime)
+		if not ret:
+			from .mime import ANCESTORS
+			for ancestor in ANCESTORS.ordered(mime):
+				ret = self.associations(ancestor.name())
+				if ret:
+					break
+
+		ret = self._best[mime] = ret and ret[0] or None
+		return ret
+
+RESOLVER = xdg.LazyTable(Resolver)
 
-def associationsFor(mime):
-	ret = []
-	x = ACTIONS.defaultApplication(mime)
-	if x:
-		return ret.append(x)
 
-	ret += ACTIONS.addedAssociations(mime)
+def defaultApplication(mime):
+	return ACTIONS.defaultApplication(mime)
 
-	ret += CACHE.associationsFor(mime, exclude=ACTIONS.removedAssociations(mime))
+def bestApplication(mime):
+	return RESOLVER.bestApplication(mime)
 
-	return ret
+def associationsFor(mime):
+	return list(RESOLVER.associations(mime))
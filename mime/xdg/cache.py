@@ -0,0 +1,382 @@
+"""
+Reader for the binary mime.cache generated by update-mime-database
+http://standards.freedesktop.org/shared-mime-info-spec/shared-mime-info-spec-0.20.html#idm140625828606432
+
+The cache is mmapped and every lookup is answered straight from the shared
+pages: lists are binary-searched and the suffix tree is walked in place, so
+no per-entry Python objects are ever created. The magic rules and the
+glob patterns are the exceptions, see MimeCache.loadMagic and
+MimeCache._loadGlobs.
+"""
+
+import mmap
+import os
+import struct
+from operator import itemgetter
+from .. import statistics
+
+MAJOR_VERSION = 1
+MINOR_VERSIONS = (1, 2)
+
+# Text files update-mime-database generates alongside the cache. If any of
+# them is newer than mime.cache, the cache is stale.
+SOURCE_FILES = ("aliases", "generic-icons", "globs2", "icons", "magic", "subclasses")
+
+CASE_SENSITIVE = 0x100
+WEIGHT_MASK = 0xff
+
+_header = struct.Struct(">HH9I")
+_uint32 = struct.Struct(">I")
+_pair = struct.Struct(">II")
+_triple = struct.Struct(">III")
+_match = struct.Struct(">IIII")
+_matchlet = struct.Struct(">IIIIIIII")
+
+# Sort key of (weight, mime, length) glob matches
+_rank = itemgetter(0, 2)
+
+
+class MimeCache(object):
+	"""
+	/usr/share/mime/mime.cache
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		# Glob list matcher, built on first use
+		self._globs = None
+		with open(path, "rb") as file:
+			self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+		if len(self._map) < _header.size:
+			raise ValueError("Truncated cache %r" % (path))
+
+		(major, minor, self._aliasList, self._parentList, self._literalList,
+			self._suffixTree, self._globList, self._magicList, self._namespaceList,
+			self._iconsList, self._genericIconsList) = _header.unpack_from(self._map, 0)
+
+		if major != MAJOR_VERSION or minor not in MINOR_VERSIONS:
+			raise ValueError("Unsupported cache version %i.%i in %r" % (major, minor, path))
+
+	def __repr__(self):
+		return "<MimeCache: %s>" % (self.path)
+
+	def close(self):
+		self._map.close()
+
+	def _string(self, offset):
+		end = self._map.find(b"\0", offset)
+		return self._map[offset:end].decode("utf-8")
+
+	def _search(self, listOffset, stride, key):
+		"""
+		Binary search a list sorted on the string its entries point to first.
+		Returns the offset of the matching entry, or None.
+		"""
+		buf = self._map
+		count, = _uint32.unpack_from(buf, listOffset)
+		start = listOffset + 4
+		lo, hi = 0, count
+		while lo < hi:
+			mid = (lo + hi) // 2
+			entry = start + mid * stride
+			offset, = _uint32.unpack_from(buf, entry)
+			end = buf.find(b"\0", offset)
+			value = buf[offset:end]
+			if value < key:
+				lo = mid + 1
+			elif value > key:
+				hi = mid
+			else:
+				return entry
+
+	def _lookup(self, listOffset, name):
+		entry = self._search(listOffset, 8, name.encode("utf-8"))
+		if entry is not None:
+			offset, = _uint32.unpack_from(self._map, entry + 4)
+			return self._string(offset)
+
+	def alias(self, name):
+		return self._lookup(self._aliasList, name)
+
+	def icon(self, name):
+		return self._lookup(self._iconsList, name)
+
+	def genericIcon(self, name):
+		return self._lookup(self._genericIconsList, name)
+
+	def parents(self, name):
+		entry = self._search(self._parentList, 8, name.encode("utf-8"))
+		if entry is None:
+			return []
+
+		buf = self._map
+		offset, = _uint32.unpack_from(buf, entry + 4)
+		count, = _uint32.unpack_from(buf, offset)
+		return [self._string(_uint32.unpack_from(buf, offset + 4 + i * 4)[0]) for i in range(count)]
+
+	# Globs
+
+	def _matchLiteral(self, ret, name, lowered):
+		entry = self._search(self._literalList, 12, name.encode("utf-8"))
+		if entry is not None:
+			_, mime, weight = _triple.unpack_from(self._map, entry)
+			if not lowered or not weight & CASE_SENSITIVE:
+				ret.append((weight & WEIGHT_MASK, self._string(mime), len(name)))
+
+	def _matchSuffix(self, ret, name, lowered):
+		"""
+		Walk the reverse suffix tree from the last character of name,
+		collecting the leaves of every node on the way
+		"""
+		buf = self._map
+		count, offset = _pair.unpack_from(buf, self._suffixTree)
+		depth = 0
+		for c in reversed(name):
+			c = ord(c)
+			# Children are sorted by character, leaves (character 0) first
+			lo, hi = 0, count
+			node = None
+			while lo < hi:
+				mid = (lo + hi) // 2
+				character, = _uint32.unpack_from(buf, offset + mid * 12)
+				if character < c:
+					lo = mid + 1
+				elif character > c:
+					hi = mid
+				else:
+					node = offset + mid * 12
+					break
+			if node is None:
+				break
+
+			depth += 1
+			_, count, offset = _triple.unpack_from(buf, node)
+			for i in range(count):
+				character, mime, weight = _triple.unpack_from(buf, offset + i * 12)
+				if character:
+					break
+				if lowered and weight & CASE_SENSITIVE:
+					continue
+				# Length of the glob, including its leading "*"
+				ret.append((weight & WEIGHT_MASK, self._string(mime), depth + 1))
+
+	def _loadGlobs(self):
+		"""
+		Decode the glob list once into a GlobMatcher, with keys packed like
+		GlobsFile's so that, at equal weight and length, the glob listed
+		first wins
+		"""
+		from .mime import GlobMatcher, GlobsFile
+		buf = self._map
+		count, = _uint32.unpack_from(buf, self._globList)
+		keys = []
+		self._globMatches = {}
+		for i in range(count):
+			glob, mime, weight = _triple.unpack_from(buf, self._globList + 4 + i * 12)
+			glob = self._string(glob)
+			length = min(len(glob), (1 << GlobsFile.LENGTH_BITS) - 1)
+			key = (((weight & WEIGHT_MASK) << GlobsFile.LENGTH_BITS | length) << GlobsFile.RANK_SHIFT) | (GlobsFile.INDEX_MASK - i)
+			keys.append((key, glob, not weight & CASE_SENSITIVE))
+			self._globMatches[key] = (weight & WEIGHT_MASK, self._string(mime), len(glob))
+		self._globs = GlobMatcher(keys)
+
+	def _matchGlob(self, ret, name, lowered):
+		if self._globs is None:
+			self._loadGlobs()
+		found = []
+		self._globs.keys(found, name, lowered)
+		if found:
+			# Best first, ties in the cache order
+			ret += [self._globMatches[key] for key in sorted((key for keys in found for key in keys), reverse=True)]
+
+	def matchGlob(self, name, tiers=None, folded=False):
+		"""
+		Returns (weight, mime, length) tuples for every glob matching name,
+		literal, suffix or pattern, best first: like GlobsFile, the
+		heaviest glob wins, then the longest, whichever kind it is. With
+		folded, name is lowercased and only the globs without the cs flag
+		are tried.
+		If tiers is a list, the name of the tier each match comes from is
+		appended to it, in the order of the returned matches.
+		"""
+		ret = []
+		if folded:
+			name = name.lower()
+		if tiers is None:
+			self._matchLiteral(ret, name, folded)
+			self._matchSuffix(ret, name, folded)
+			self._matchGlob(ret, name, folded)
+			if len(ret) > 1:
+				# Stable, so that ties keep the cache order
+				ret.sort(key=_rank, reverse=True)
+			return ret
+
+		found = []
+		prefix = folded and "folded-" or ""
+		for lookup, tier in ((self._matchLiteral, "literal"), (self._matchSuffix, "extension"), (self._matchGlob, "pattern")):
+			count = len(ret)
+			lookup(ret, name, folded)
+			found += [prefix + tier] * (len(ret) - count)
+
+		# Stable, so that ties keep the cache order
+		order = sorted(range(len(ret)), key=lambda i: (ret[i][0], ret[i][2]), reverse=True)
+		if tiers is not None:
+			tiers += [found[i] for i in order]
+		return [ret[i] for i in order]
+
+	# Magic
+
+	def _loadMatchlets(self, cls, rules, count, offset, indent):
+		buf = self._map
+		for i in range(count):
+			(rangeStart, rangeLength, wordSize, valueLength,
+				value, mask, nChildren, children) = _matchlet.unpack_from(buf, offset + i * _matchlet.size)
+			value = buf[value:value + valueLength]
+			mask = mask and buf[mask:mask + valueLength] or None
+			rules.append(cls(indent, rangeStart, value, mask, wordSize, rangeLength))
+			self._loadMatchlets(cls, rules, nChildren, children, indent + 1)
+
+	def loadMagic(self, magic):
+		"""
+		Add the magic sections of the cache to magic, a MagicFile.
+		Unlike the other tables, they are compiled into Python objects: the
+		rules are evaluated far more often than they are loaded.
+		"""
+		buf = self._map
+		count, _, offset = _triple.unpack_from(buf, self._magicList)
+		for i in range(count):
+			priority, mime, nMatchlets, matchlets = _match.unpack_from(buf, offset + i * _match.size)
+			rules = []
+			self._loadMatchlets(magic.Magic, rules, nMatchlets, matchlets, 0)
+			magic.addSection(priority, self._string(mime), rules)
+
+
+def swapWords(value, wordSize):
+	"""
+	Reverse every group of wordSize bytes in value, for little-endian hosts
+	"""
+	ret = bytearray(value)
+	for i in range(0, len(ret) - wordSize + 1, wordSize):
+		ret[i:i + wordSize] = ret[i:i + wordSize][::-1]
+	return bytes(ret)
+
+
+def isFresh(base):
+	"""
+	Returns True if base/mime.cache exists and is at least as recent as
+	every source file update-mime-database generated next to it.
+	"""
+	try:
+		mtime = os.stat(os.path.join(base, "mime.cache")).st_mtime
+	except OSError:
+		return False
+
+	for name in SOURCE_FILES:
+		try:
+			if os.stat(os.path.join(base, name)).st_mtime > mtime:
+				return False
+		except OSError:
+			pass
+
+	return True
+
+def openCaches(dirs):
+	"""
+	Open the mime.cache of every directory in dirs that holds a MIME
+	database. Returns None if any of them is missing, stale or unreadable,
+	in which case the text files should be parsed instead.
+	"""
+	ret = []
+	for base in dirs:
+		if not any(os.path.exists(os.path.join(base, name)) for name in SOURCE_FILES):
+			# Only packages/, nothing generated yet
+			continue
+
+		if not isFresh(base):
+			return
+
+		path = os.path.join(base, "mime.cache")
+		start = statistics.clock()
+		try:
+			ret.append(MimeCache(path))
+		except (EnvironmentError, ValueError):
+			return
+		statistics.timing("load." + path, start)
+
+	return ret
+
+
+class CacheTable(object):
+	"""
+	Base for the views answering the text file APIs from a list of caches,
+	most important first. Caches are queried in that order so that, like
+	with the text parsers, the most important directory wins.
+	"""
+	def __init__(self, caches):
+		self._caches = caches
+
+	def __repr__(self):
+		return "<%s: %r>" % (self.__class__.__name__, self._caches)
+
+class CacheAliases(CacheTable):
+	def get(self, name, default=None):
+		for cache in self._caches:
+			ret = cache.alias(name)
+			if ret is not None:
+				return ret
+		return default
+
+class CacheGenericIcons(CacheTable):
+	def get(self, name, default=None):
+		for cache in self._caches:
+			ret = cache.genericIcon(name)
+			if ret is not None:
+				return ret
+		return default
+
+class CacheSubclasses(CacheTable):
+	def get(self, name, default=None):
+		for cache in self._caches:
+			ret = cache.parents(name)
+			if ret:
+				return ret
+		return default
+
+class CacheGlobs(CacheTable):
+	def _matches(self, name):
+		tiers = None
+		if statistics.ENABLED:
+			tiers = []
+		# Like with the text files, the lowercased name is only tried when
+		# nothing matches the name itself
+		ret = []
+		for folded in (False, True):
+			for cache in self._caches:
+				ret += cache.matchGlob(name, tiers, folded)
+			if ret or name.lower() == name:
+				break
+		if tiers is None:
+			if len(self._caches) > 1 and len(ret) > 1:
+				ret.sort(key=_rank, reverse=True)
+			return ret
+
+		order = sorted(range(len(ret)), key=lambda i: _rank(ret[i]), reverse=True)
+		statistics.count("globs." + (order and tiers[order[0]] or "miss"))
+		return [ret[i] for i in order]
+
+	def match(self, name):
+		ret = self._matches(name)
+		if not ret:
+			return ""
+		return ret[0][1]
+
+	def matchAll(self, name):
+		ret = []
+		matches = self._matches(name)
+		for weight, mime, length in matches:
+			if (weight, length) != (matches[0][0], matches[0][2]):
+				break
+			if mime not in ret:
+				ret.append(mime)
+		return ret
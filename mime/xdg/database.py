@@ -0,0 +1,201 @@
+"""
+Change detection for the MIME and actions databases
+
+Every table remembers the stamp of the files it was built from. refresh()
+stats them again and rebuilds the loaded tables whose files changed, after
+installPackage or update-mime-database ran for instance. Tables are
+swapped in whole, so concurrent lookups see either the old table or the
+new one.
+"""
+
+import os
+import threading
+from . import actions, mime, snapshot, xdg
+
+# inotify(7) events that can change a table
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+class Database(object):
+	"""
+	The tables, in the order they have to be rebuilt in. The sources of a
+	table built from another include those of the other, so that both are
+	rebuilt together.
+	"""
+
+	def __init__(self):
+		self._tables = []
+		self._caches = []
+		self._lock = threading.Lock()
+
+	def __repr__(self):
+		return "<Database: %i tables>" % (len(self._tables))
+
+	def add(self, table, *sources, **kwargs):
+		"""
+		Track table, a LazyTable built from the files sources resolve to,
+		and from the directories the trees keyword argument resolves to
+		with everything below them.
+		Tables others are built from must be added first.
+		"""
+		table.sources = sources
+		table.trees = kwargs.get("trees", ())
+		self._tables.append(table)
+
+	def addCache(self, cache):
+		"""
+		Track cache, an LRUCache of results derived from the tables, to be
+		cleared whenever any of them is rebuilt
+		"""
+		self._caches.append(cache)
+
+	def directories(self):
+		"""
+		Returns the directories holding the files of every table
+		"""
+		ret = set()
+		for table in self._tables:
+			for name in table.sources:
+				ret.update(xdg.getFiles(os.path.dirname(name) or name))
+			for name in table.trees:
+				ret.update(path for path, mtime in xdg.stampDirectories(name))
+		return sorted(ret)
+
+	def refresh(self):
+		"""
+		Rebuild the loaded tables whose files changed since they were built.
+		Tables that were never loaded are left alone, they will be built
+		from the current files anyway. Returns the tables that were rebuilt.
+		"""
+		ret = []
+		with self._lock:
+			# Files may have been added or removed
+			xdg.invalidateFiles()
+			for table in self._tables:
+				if table.isLoaded() and table.stamp != table.getStamp():
+					if not ret and table is not snapshot.SNAPSHOT and snapshot.SNAPSHOT in self._tables and snapshot.SNAPSHOT.isLoaded():
+						# It holds the tables built from the previous files,
+						# which reloading would return again
+						snapshot.SNAPSHOT.clear()
+					table.reload()
+					ret.append(table)
+			if ret:
+				for cache in self._caches:
+					cache.clear()
+		return ret
+
+	def watch(self, interval=5):
+		"""
+		Start a thread refreshing the database as its files change.
+		See Watcher.
+		"""
+		ret = Watcher(self, interval)
+		ret.start()
+		return ret
+
+
+class Watcher(threading.Thread):
+	"""
+	Thread calling Database.refresh when the directories of the database
+	change, with inotify where available. Otherwise, and to notice new
+	directories, the database is also refreshed every interval seconds.
+	"""
+
+	# Wait for writes to settle: update-mime-database writes many files
+	DELAY = 0.2
+
+	def __init__(self, database, interval=5):
+		super(Watcher, self).__init__(name="mime-database-watcher")
+		self.daemon = True
+		self.database = database
+		self.interval = interval
+		self._stopped = threading.Event()
+		self._inotify = None
+		self._watched = set()
+
+	def _openInotify(self):
+		try:
+			import ctypes
+			import ctypes.util
+			libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+			fd = libc.inotify_init1(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+		except (AttributeError, OSError):
+			return
+
+		if fd < 0:
+			return
+		self._libc = libc
+		return fd
+
+	def _addWatches(self):
+		for path in self.database.directories():
+			if path not in self._watched:
+				if self._libc.inotify_add_watch(self._inotify, path.encode("utf-8"), WATCH_MASK) >= 0:
+					self._watched.add(path)
+
+	def _drain(self):
+		try:
+			while os.read(self._inotify, 4096):
+				pass
+		except OSError:
+			pass
+
+	def _wait(self):
+		"""
+		Returns when the directories changed or interval elapsed
+		"""
+		if self._inotify is None:
+			self._stopped.wait(self.interval)
+			return
+
+		import select
+		ready, _, _ = select.select([self._inotify], [], [], self.interval)
+		if ready:
+			self._stopped.wait(self.DELAY)
+			self._drain()
+
+	def run(self):
+		self._inotify = self._openInotify()
+		try:
+			while not self._stopped.is_set():
+				if self._inotify is not None:
+					self._addWatches()
+				self._wait()
+				if not self._stopped.is_set():
+					self.database.refresh()
+		finally:
+			if self._inotify is not None:
+				os.close(self._inotify)
+
+	def stop(self):
+		self._stopped.set()
+
+
+DATABASE = Database()
+DATABASE.add(snapshot.SNAPSHOT, *snapshot.SOURCES)
+DATABASE.add(mime.CACHES, "mime/mime.cache")
+DATABASE.add(mime.ALIASES, "mime/aliases", "mime/mime.cache")
+DATABASE.add(mime.GLOBS, "mime/globs2", "mime/mime.cache")
+DATABASE.add(mime.ICONS, "mime/generic-icons", "mime/mime.cache")
+DATABASE.add(mime.MAGIC, "mime/magic", "mime/mime.cache")
+DATABASE.add(mime.SUBCLASSES, "mime/subclasses", "mime/mime.cache")
+DATABASE.add(mime.ANCESTORS, "mime/aliases", "mime/subclasses", "mime/mime.cache")
+DATABASE.add(mime.METADATA, "mime/packages", "mime/mime.cache")
+DATABASE.add(xdg.DESKTOP_FILES, trees=("applications", ))
+DATABASE.add(actions.ACTIONS, "applications/mimeapps.list", trees=("applications", ))
+DATABASE.add(actions.CACHE, "applications/mimeinfo.cache")
+DATABASE.add(actions.RESOLVER, "applications/mimeapps.list", "applications/mimeinfo.cache", "mime/aliases", "mime/subclasses", "mime/mime.cache", trees=("applications", ))
+DATABASE.addCache(mime.NAMES)
+DATABASE.addCache(mime.CONTENTS)
+
+def refresh():
+	"""
+	Rebuild whatever changed in the database. See Database.refresh.
+	"""
+	return DATABASE.refresh()
@@ -10,13 +10,46 @@ update-mime-database command, which is provided by the freedesktop.org
 shared mime database package.
 """
 
+import mmap
 import os
 import struct
-from fnmatch import fnmatch
-from xml.dom import minidom, XML_NAMESPACE
-from . import xdg
+import sys
+from . import cache, xdg
+from .. import statistics
 from ..basemime import BaseMime
 
+try:
+	basestring
+except NameError:
+	basestring = (str, bytes)
+
+try:
+	intern
+except NameError:
+	from sys import intern
+
+# Answer lookups from the binary mime.cache when every database has a fresh
+# one; otherwise (None), parse the text files.
+CACHES = xdg.LazyTable(lambda: cache.openCaches(xdg.getFiles("mime")))
+
+def _loadTable(cls, view, name):
+	from .snapshot import SNAPSHOT
+
+	def build():
+		caches = CACHES.load()
+		if caches is not None:
+			return view(caches)
+
+		# Least important first, so that the others override it
+		ret = cls()
+		for f in reversed(xdg.getFiles(name)):
+			start = statistics.clock()
+			ret.parse(f)
+			statistics.timing("load." + f, start)
+		return ret
+
+	return SNAPSHOT.get(name, build)
+
 
 class BaseFile(object):
 	def __init__(self):
@@ -41,73 +74,365 @@ class AliasesFile(BaseFile):
 				mime, alias = line.split(" ")
 				self._keys[mime] = alias
 
-ALIASES = AliasesFile()
-for f in xdg.getFiles("mime/aliases"):
-	ALIASES.parse(f)
+ALIASES = xdg.LazyTable(_loadTable, AliasesFile, cache.CacheAliases, "mime/aliases")
+
+
+def isWildcard(glob):
+	return "*" in glob or "?" in glob or "[" in glob
+
+class PatternIndex(object):
+	"""
+	Patterns indexed by their leading literal, or when they start with a
+	wildcard by their trailing one, or else by the longest literal they
+	hold, so that a name is only tested against the patterns that can
+	match it. Each is compiled on first use.
+	"""
+	WILDCARDS = "*?["
+
+	def __init__(self):
+		# Literal length, then literal, to the (key, glob) lists starting,
+		# ending with or holding it
+		self._prefixes = {}
+		self._suffixes = {}
+		self._infixes = {}
+		self._others = []
+		self._regexes = {}
+
+	@staticmethod
+	def _literal(glob):
+		# Longest run of characters outside wildcards and brackets, which
+		# every matching name holds
+		ret = run = ""
+		i = 0
+		while i < len(glob):
+			c = glob[i]
+			if c in "*?[":
+				ret = max(ret, run, key=len)
+				run = ""
+				if c == "[":
+					# As fnmatch reads them: a leading ! or ] belongs to the set
+					j = i + 1
+					if glob[j:j + 1] == "!":
+						j += 1
+					if glob[j:j + 1] == "]":
+						j += 1
+					i = glob.find("]", j)
+					if i < 0:
+						return ret
+			else:
+				run += c
+			i += 1
+		return max(ret, run, key=len)
+
+	def add(self, key, glob):
+		i = 0
+		while i < len(glob) and glob[i] not in self.WILDCARDS:
+			i += 1
+		if i:
+			self._prefixes.setdefault(i, {}).setdefault(glob[:i], []).append((key, glob))
+			return
+
+		i = len(glob)
+		while i and glob[i - 1] not in self.WILDCARDS and glob[i - 1] != "]":
+			i -= 1
+		if i < len(glob):
+			suffix = glob[i:]
+			self._suffixes.setdefault(len(suffix), {}).setdefault(suffix, []).append((key, glob))
+			return
+
+		literal = self._literal(glob)
+		if literal:
+			self._infixes.setdefault(len(literal), {}).setdefault(literal, []).append((key, glob))
+		else:
+			self._others.append((key, glob))
+
+	def sort(self):
+		# Best first, so that lookups can stop at the first worse pattern
+		for table in (self._prefixes, self._suffixes, self._infixes):
+			for literals in table.values():
+				for patterns in literals.values():
+					patterns.sort(reverse=True)
+		self._others.sort(reverse=True)
+
+	def _candidates(self, name):
+		ret = []
+		for length, literals in self._prefixes.items():
+			patterns = literals.get(name[:length])
+			if patterns:
+				ret.append(patterns)
+		for length, literals in self._suffixes.items():
+			patterns = literals.get(name[-length:])
+			if patterns:
+				ret.append(patterns)
+		for length, literals in self._infixes.items():
+			positions = len(name) - length + 1
+			if len(literals) < positions:
+				# Fewer literals than places to look for them
+				ret += [patterns for literal, patterns in literals.items() if literal in name]
+				continue
+			seen = set()
+			for i in range(positions):
+				literal = name[i:i + length]
+				patterns = literals.get(literal)
+				if patterns and literal not in seen:
+					seen.add(literal)
+					ret.append(patterns)
+		if self._others:
+			ret.append(self._others)
+		return ret
+
+	def _match(self, glob, name):
+		match = self._regexes.get(glob)
+		if match is None:
+			from fnmatch import translate
+			import re
+			match = self._regexes[glob] = re.compile(translate(glob)).match
+		return match(name) is not None
+
+	def match(self, ret, name):
+		"""
+		Append the (key, ) tuples of the best patterns matching name to ret:
+		every match of the highest weight and length
+		"""
+		shift = GlobsFile.RANK_SHIFT
+		best = None
+		hits = []
+		for patterns in self._candidates(name):
+			for key, glob in patterns:
+				rank = key >> shift
+				if best is not None and rank < best:
+					break
+				if self._match(glob, name):
+					if best is None or rank > best:
+						best = rank
+						hits = []
+					hits.append((key, ))
+		ret += hits
+
+
+class GlobMatcher(object):
+	"""
+	Compiled matcher for the globs2 patterns the literal and extension
+	tables can't answer.
+	Patterns of the form *<literal> go in a reversed-character trie, the
+	others in a PatternIndex. Patterns without the cs flag are also tried
+	against the lowercased name.
+	"""
+	def __init__(self, matches):
+		self._suffixes = {}
+		self._foldedSuffixes = {}
+		self._patterns = PatternIndex()
+		self._foldedPatterns = PatternIndex()
+		for key, glob, folded in matches:
+			if glob.startswith("*") and not isWildcard(glob[1:]):
+				self._addSuffix(self._suffixes, glob[1:], key)
+				if folded:
+					self._addSuffix(self._foldedSuffixes, glob[1:], key)
+			else:
+				self._patterns.add(key, glob)
+				if folded:
+					self._foldedPatterns.add(key, glob)
+		self._patterns.sort()
+		self._foldedPatterns.sort()
+
+	def _addSuffix(self, node, suffix, key):
+		for c in reversed(suffix):
+			node = node.setdefault(c, {})
+		# Terminals live under the empty key, which no character can collide with
+		addKey(node, "", key)
+
+	def _matchSuffix(self, ret, node, name):
+		for c in reversed(name):
+			node = node.get(c)
+			if node is None:
+				break
+			if "" in node:
+				ret.append(node[""])
+
+	def keys(self, ret, name, folded=False, tiers=None):
+		"""
+		Append the key lists of the patterns matching name to ret, and if
+		tiers is a list, as many tier names to it. With folded, name is
+		lowercased and only the patterns without the cs flag are tried.
+		"""
+		count = len(ret)
+		if folded:
+			self._matchSuffix(ret, self._foldedSuffixes, name)
+			self._foldedPatterns.match(ret, name)
+		else:
+			self._matchSuffix(ret, self._suffixes, name)
+			self._patterns.match(ret, name)
+		if tiers is not None:
+			tiers += [folded and "folded-pattern" or "pattern"] * (len(ret) - count)
+
+
+def addKey(table, glob, key, single=None):
+	"""
+	Add key to the tuple stored under glob in table, keeping it sorted with
+	the best key first. single, if given, is the (key, ) tuple to store when
+	glob is new, so that tables can share it.
+	"""
+	keys = table.get(glob)
+	if keys is None:
+		table[glob] = single or (key, )
+	else:
+		table[glob] = tuple(sorted(keys + (key, ), reverse=True))
 
 
 class GlobsFile(object):
 	"""
 	/usr/share/mime/globs2
+
+	Every glob is stored under a key packing its weight, length, file and
+	index into a single int, so that comparing keys picks the heaviest glob,
+	then the longest, then the one from the file parsed last, then the one
+	listed first, whichever table it lives in. Its MIME type, interned, is
+	found by index in a list.
+	Globs without the cs flag are also stored in the folded tables, which
+	are looked up with the lowercased name.
 	"""
+	INDEX_BITS = 24
+	FILE_BITS = 8
+	LENGTH_BITS = 16
+	# Keys shifted right by RANK_SHIFT compare as (weight, length)
+	RANK_SHIFT = INDEX_BITS + FILE_BITS
+	INDEX_MASK = (1 << INDEX_BITS) - 1
+
 	def __init__(self):
 		self._extensions = {}
+		self._foldedExtensions = {}
 		self._literals = {}
+		self._foldedLiterals = {}
 		self._matches = []
+		self._matcher = None
+		self._mimes = []
+		self._files = 0
+
+	def __getstate__(self):
+		# The matcher is rebuilt on first use
+		ret = self.__dict__.copy()
+		ret["_matcher"] = None
+		return ret
+
+	def _mime(self, key):
+		return self._mimes[self.INDEX_MASK - (key & self.INDEX_MASK)]
 
 	def parse(self, path):
+		self._files += 1
+		mimes = self._mimes
+		rank = min(self._files, (1 << self.FILE_BITS) - 1)
+		# Like in mime.cache, only the first of the lines listing the same
+		# glob for the same type counts, with or without the cs flag
+		seen = set()
 		with open(path, "r") as file:
 			for line in file:
 				if line.startswith("#"): # comment
 					continue
 
-				if line.endswith("\n"):
-					line = line[:-1]
-
-				weight, _, line = line.partition(":")
-				mime, _, line = line.partition(":")
-				glob, _, line = line.partition(":")
-				flags, _, line = line.partition(":")
-				flags = flags and flags.split(",") or []
-
-				if "*" not in glob and "?" not in glob and "[" not in glob:
-					self._literals[glob] = mime
-
-				elif glob.startswith("*.") and "cs" not in flags:
+				fields = line.rstrip("\n").split(":", 4)
+				if len(fields) < 3 or (fields[1], fields[2]) in seen:
+					continue
+				seen.add((fields[1], fields[2]))
+				folded = len(fields) < 4 or "cs" not in fields[3].split(",")
+				glob = fields[2]
+
+				length = min(len(glob), (1 << self.LENGTH_BITS) - 1)
+				key = (((int(fields[0]) << self.LENGTH_BITS | length) << self.FILE_BITS | rank) << self.INDEX_BITS) | (self.INDEX_MASK - len(mimes))
+				mimes.append(intern(fields[1]))
+				single = (key, )
+
+				if not isWildcard(glob):
+					addKey(self._literals, glob, key, single)
+					if folded:
+						addKey(self._foldedLiterals, glob, key, single)
+
+				elif glob.startswith("*.") and not isWildcard(glob[1:]):
+					# Simple and compound extensions (*.gz, *.tar.gz)
 					extension = glob[1:]
-					if "*" not in extension and "?" not in extension and "[" not in extension:
-						self._extensions[extension] = mime
+					addKey(self._extensions, extension, key, single)
+					if folded:
+						addKey(self._foldedExtensions, extension, key, single)
 
 				else:
-					self._matches.append((int(weight), mime, glob, flags))
-
-	def match(self, name):
-		if name in self._literals:
-			return self._literals[name]
+					self._matches.append((key, glob, folded))
 
-		_, extension = os.path.splitext(name)
-		if extension in self._extensions:
-			return self._extensions[extension]
-		elif extension.lower() in self._extensions:
-			return self._extensions[extension.lower()]
+		self._matcher = None
 
-		matches = []
-		for weight, mime, glob, flags in self._matches:
-			if fnmatch(name, glob):
-				matches.append((weight, mime, glob))
-
-			elif "cs" not in flags and fnmatch(name.lower(), glob):
-				matches.append((weight, mime, glob))
+	def _collect(self, name, folded, tiers):
+		"""
+		Returns the key lists of every glob matching name, or with folded,
+		of the globs without the cs flag matching name, lowercased
+		"""
+		ret = []
+		self._matcher.keys(ret, name, folded, tiers)
+		literals, extensions, prefix = self._literals, self._extensions, ""
+		if folded:
+			literals, extensions, prefix = self._foldedLiterals, self._foldedExtensions, "folded-"
+
+		if name in literals:
+			ret.append(literals[name])
+			if tiers is not None:
+				tiers.append(prefix + "literal")
+
+		# Try every dot-suffix of the name, from the longest to the shortest
+		i = name.find(".")
+		while i != -1:
+			extension = name[i:]
+			if extension in extensions:
+				ret.append(extensions[extension])
+				if tiers is not None:
+					tiers.append(prefix + "extension")
+			i = name.find(".", i + 1)
+		return ret
+
+	def _keys(self, name):
+		"""
+		Returns the key lists of every glob matching name
+		"""
+		# The table each key list comes from, to count the one that wins
+		tiers = None
+		if statistics.ENABLED:
+			tiers = []
+		if self._matcher is None:
+			self._matcher = GlobMatcher(self._matches)
+
+		# Like with mime.cache, the lowercased name is only tried when
+		# nothing matches the name itself
+		ret = self._collect(name, False, tiers)
+		lower = name.lower()
+		if not ret and lower != name:
+			ret = self._collect(lower, True, tiers)
+
+		if tiers is not None:
+			statistics.count("globs." + (ret and tiers[max(range(len(ret)), key=ret.__getitem__)] or "miss"))
+		return ret
 
-		if not matches:
+	def match(self, name):
+		keys = self._keys(name)
+		if not keys:
 			return ""
+		return self._mime(max(keys)[0])
 
-		weight, mime, glob = max(matches, key=lambda weight_mime_glob: (weight_mime_glob[0], len(weight_mime_glob[2])))
-		return mime
+	def matchAll(self, name):
+		"""
+		Returns every MIME type whose glob ties for the best match on name,
+		best first. More than one means the name alone is ambiguous.
+		"""
+		keys = sorted(key for keys in self._keys(name) for key in keys)
+		if not keys:
+			return []
+
+		best = keys[-1] >> self.RANK_SHIFT
+		ret = []
+		for key in reversed(keys):
+			if key >> self.RANK_SHIFT != best:
+				break
+			mime = self._mime(key)
+			if mime not in ret:
+				ret.append(mime)
+		return ret
 
-GLOBS = GlobsFile()
-for f in xdg.getFiles("mime/globs2"):
-	GLOBS.parse(f)
+GLOBS = xdg.LazyTable(_loadTable, GlobsFile, cache.CacheGlobs, "mime/globs2")
 
 
 class IconsFile(BaseFile):
@@ -124,149 +449,335 @@ class IconsFile(BaseFile):
 				mime, icon = line.split(":")
 				self._keys[mime] = icon
 
-ICONS = IconsFile()
-for f in xdg.getFiles("mime/generic-icons"):
-	ICONS.parse(f)
+ICONS = xdg.LazyTable(_loadTable, IconsFile, cache.CacheGenericIcons, "mime/generic-icons")
 
 
+# Match a magic rule up to its value length, and what follows its value
+# and mask. Compiled on first use to keep re out of the import.
+_ruleHead = None
+_ruleTail = None
+
 class MagicFile(BaseFile):
 	"""
 	/usr/share/mime/magic
+
+	Sections are compiled into a flat table sorted by descending priority,
+	each holding the tree its rules' indents describe. A file is sniffed by
+	reading extent() bytes once and walking the table until a section
+	matches.
 	"""
 	class Magic(object):
-		def __init__(self, *args):
-			pass
-
-	def readNumber(self, file):
-		ret = bytearray()
-		c = file.read(1)
-		while c:
-			if not c.isdigit():
-				file.seek(-1, os.SEEK_CUR)
-				break
-			ret.append(ord(c))
-			c = file.read(1)
+		"""
+		A rule: the value, compared at every offset of its range, and the
+		rules indented below it, of which at least one must match as well
+		"""
+		__slots__ = ("indent", "start", "value", "mask", "wordSize", "rangeLength", "children", "end", "_mask", "_masked")
+
+		def __init__(self, indent, start, value, mask=None, wordSize=1, rangeLength=1):
+			if wordSize > 1 and sys.byteorder == "little":
+				value = cache.swapWords(value, wordSize)
+				if mask is not None:
+					mask = cache.swapWords(mask, wordSize)
+
+			self._set(indent, start, value, mask, wordSize, rangeLength)
+
+		def _set(self, indent, start, value, mask, wordSize, rangeLength):
+			self.indent = indent
+			self.start = start
+			self.value = value
+			self.mask = mask
+			self.wordSize = wordSize
+			self.rangeLength = max(rangeLength, 1)
+			self.children = []
+			# End of the last window the value can be found in
+			self.end = start + self.rangeLength - 1 + len(value)
+
+			if mask is not None:
+				self._mask = int.from_bytes(mask, "big")
+				self._masked = int.from_bytes(value, "big") & self._mask
+
+		def __repr__(self):
+			return "<Magic: %i>%i=%r>" % (self.indent, self.start, self.value)
+
+		def freeze(self):
+			"""
+			Returns the rule and its children as nested tuples, values in
+			host order
+			"""
+			return (self.indent, self.start, self.value, self.mask, self.wordSize, self.rangeLength, tuple([child.freeze() for child in self.children]))
+
+		@classmethod
+		def thaw(cls, state):
+			ret = cls.__new__(cls)
+			ret._set(*state[:6])
+			ret.children = [cls.thaw(child) for child in state[6]]
+			return ret
+
+		def anchor(self, length):
+			"""
+			Returns up to length leading bytes of the value that have to be
+			found, unmasked, for the rule to match, or None if there are none
+			"""
+			value = self.value
+			if self.mask is not None:
+				unmasked = 0
+				while unmasked < len(value) and bytearray(self.mask)[unmasked] == 0xff:
+					unmasked += 1
+				value = value[:unmasked]
+			return value[:length] or None
+
+		def extent(self):
+			return max([self.end] + [child.extent() for child in self.children])
+
+		def matchValue(self, data):
+			start, value = self.start, self.value
+			if self.mask is None:
+				if self.rangeLength == 1:
+					return data[start:start + len(value)] == value
+				return data.find(value, start, self.end) != -1
+
+			length = len(value)
+			for offset in range(start, min(start + self.rangeLength, len(data) - length + 1)):
+				if int.from_bytes(data[offset:offset + length], "big") & self._mask == self._masked:
+					return True
+			return False
+
+		def match(self, data):
+			if not self.matchValue(data):
+				return False
+			if not self.children:
+				return True
+			for child in self.children:
+				if child.match(data):
+					return True
+			return False
+
+	# How many leading bytes of a value the prefilter index is keyed on
+	ANCHOR_LENGTH = 4
+
+	def __init__(self):
+		super(MagicFile, self).__init__()
+		self._sections = []
+		self._table = None
+
+	@classmethod
+	def fromCaches(cls, caches):
+		ret = cls()
+		for mimeCache in caches:
+			mimeCache.loadMagic(ret)
+		return ret
+
+	def addSection(self, priority, mime, rules):
+		"""
+		Nest the rules of a section according to their indent and store it
+		"""
+		roots = []
+		stack = []
+		for rule in rules:
+			del stack[rule.indent:]
+			if stack:
+				stack[-1].children.append(rule)
+			else:
+				roots.append(rule)
+			stack.append(rule)
+
+		if mime not in self._keys:
+			self._keys[mime] = []
+		self._keys[mime].append((priority, roots))
+		self._sections.append((priority, mime, roots))
+		self._table = None
+
+	def __getstate__(self):
+		# Plain tuples, which pickle far faster than the rule objects, along
+		# with the compiled index
+		if self._table is None:
+			self._compile()
+		sections = [(priority, mime, [rule.freeze() for rule in rules]) for priority, mime, rules in self._sections]
+		return (sections, self._extent, self._anchors, self._ranges, self._fallback)
+
+	def __setstate__(self, state):
+		sections, self._extent, self._anchors, self._ranges, self._fallback = state
+		self._keys = {}
+		self._sections = []
+		for priority, mime, rules in sections:
+			roots = [self.Magic.thaw(rule) for rule in rules]
+			self._keys.setdefault(mime, []).append((priority, roots))
+			self._sections.append((priority, mime, roots))
+		self._table = sorted(self._sections, key=lambda section: -section[0])
+
+	def _compile(self):
+		# Stable, so that sections of equal priority keep the file order
+		self._table = sorted(self._sections, key=lambda section: -section[0])
+		self._extent = max([rule.extent() for priority, mime, rules in self._table for rule in rules] or [0])
+
+		# Index the sections by the leading bytes their rules need to find
+		# unmasked in the data: a section can only match if one of its rules
+		# finds them. Rules at a fixed offset are keyed by offset and bytes.
+		# Rules with a range are grouped by first byte, so that a single
+		# bytes.find rules out a whole group.
+		# Sections with a rule that can't be indexed are always evaluated.
+		anchors = {}
+		ranges = {}
+		self._fallback = []
+		for i, (priority, mime, rules) in enumerate(self._table):
+			prefixes = [rule.anchor(self.ANCHOR_LENGTH) for rule in rules]
+			if not all(prefixes):
+				self._fallback.append(i)
+				continue
+
+			for rule, prefix in zip(rules, prefixes):
+				if rule.rangeLength == 1:
+					table = anchors.setdefault((rule.start, len(prefix)), {})
+					table.setdefault(prefix, []).append(i)
+				else:
+					end = rule.start + rule.rangeLength - 1 + len(prefix)
+					ranges.setdefault(prefix[:1], []).append((prefix, rule.start, end, i))
+
+		self._anchors = sorted(anchors.items())
+		self._ranges = []
+		for first, rules in sorted(ranges.items()):
+			start = min(start for prefix, start, end, i in rules)
+			end = max(end for prefix, start, end, i in rules)
+			self._ranges.append((first, start, end, rules))
+
+	def extent(self):
+		"""
+		Returns how many bytes of a file the rules can look at
+		"""
+		if self._table is None:
+			self._compile()
+		return self._extent
+
+	def candidates(self, data):
+		"""
+		Returns the indices, in the priority-sorted table, of the sections
+		that may match data
+		"""
+		if self._table is None:
+			self._compile()
+
+		ret = set(self._fallback)
+		for (offset, length), table in self._anchors:
+			sections = table.get(data[offset:offset + length])
+			if sections:
+				ret.update(sections)
 
-		return ret and int(ret.decode("utf-8")) or 0
+		for first, start, end, rules in self._ranges:
+			if data.find(first, start, end) != -1:
+				for prefix, start, end, i in rules:
+					if data.find(prefix, start, end) != -1:
+						ret.add(i)
+
+		return sorted(ret)
+
+	def match(self, data):
+		"""
+		Returns the MIME type of the highest priority section matching the
+		bytes in data, or None
+		"""
+		for i in self.candidates(data):
+			priority, mime, rules = self._table[i]
+			for rule in rules:
+				if rule.match(data):
+					return mime
 
 	def parse(self, path):
+		global _ruleHead, _ruleTail
+		if _ruleHead is None:
+			import re
+			_ruleHead = re.compile(b"([0-9]*)>([0-9]*)=(..)", re.DOTALL).match
+			# Unknown extensions are ignored, like kmimetyperepository.cpp does
+			_ruleTail = re.compile(b"(?:~([0-9]*))?(?:\\+([0-9]*))?[^\n]*\n").match
+
+		# Read it all at once and parse from the buffer, the values are the
+		# only bytes ever copied out of it
 		with open(path, "rb") as file:
-			if not file.read(12) == b"MIME-Magic\0\n":
-				raise ValueError("Bad header for file %r" % (path))
-
-			sections = []
-
-			while True:
-				# Parse the head
-				# Expect a "["
-				c = file.read(1)
-
-				# Check if the file is empty
-				if not c:
-					return
-
-				if c != b"[":
-					raise ValueError("Section syntax error in %r: expected '[', got %r" % (file.name, c))
-				priority, mime = self.parseSectionHead(file)
-				if file.read(1) != b"\n":
-					raise ValueError("Odd header in %r" % (file.name))
-
-				# Parse the section(s)
-				sections = []
-				while True:
-					c = file.read(1)
-					if not c:
-						return
-					file.seek(-1, os.SEEK_CUR)
-					if c != b"[":
-						if c == b"\n": # end of file
-							return
-						else:
-							sections.append(self.parseSectionBody(file))
-					else:
-						break
-
-				# Store it all
-				if mime not in self._keys:
-					self._keys[mime] = []
-				self._keys[mime].append((priority, sections))
-
-	def parseSectionHead(self, file):
+			buf = file.read()
+
+		if not buf.startswith(b"MIME-Magic\0\n"):
+			raise ValueError("Bad header for file %r" % (path))
+
+		# Sections of equal priority are tried in the order they were added,
+		# and files parsed later take precedence: put theirs first
+		previous = self._sections
+		self._sections = []
+		size = len(buf)
+		ruleHead = _ruleHead
+		Magic = self.Magic
+		try:
+			pos = 12
+			while pos < size:
+				if buf[pos] != 0x5b: # [
+					raise ValueError("Section syntax error in %r at offset %i: expected '[', got %r" % (path, pos, buf[pos:pos + 1]))
+				priority, mime, pos = self.parseSectionHead(buf, pos)
+
+				# Parse the rules, up to the next section. Most are a bare
+				# value, which is handled inline; the others, with a mask or
+				# extensions, by parseSectionBody.
+				rules = []
+				while pos < size and buf[pos] != 0x5b:
+					match = ruleHead(buf, pos)
+					if match is not None:
+						end = match.end()
+						valueEnd = end + (buf[end - 2] << 8 | buf[end - 1])
+						if buf[valueEnd:valueEnd + 1] == b"\n":
+							indent, startOffset, _ = match.groups()
+							rules.append(Magic(indent and int(indent) or 0, int(startOffset), buf[end:valueEnd]))
+							pos = valueEnd + 1
+							continue
+					rule, pos = self.parseSectionBody(buf, pos)
+					rules.append(rule)
+
+				self.addSection(priority, mime, rules)
+		finally:
+			self._sections += previous
+
+	def parseSectionHead(self, buf, pos):
 		"""
 		Parse head of a section
 		[50:text/x-diff]\n
+		Returns the priority, the MIME type and the position of the body.
 		"""
-		s = bytearray()
-		while True:
-			c = file.read(1)
-			if not c:
-				raise ValueError("Unfinished header in %r" % (file.name))
-			if c == b"]":
-				break
-			s.append(ord(c))
+		end = buf.find(b"]\n", pos)
+		if end == -1:
+			raise ValueError("Unfinished header at offset %i" % (pos))
 
+		s = buf[pos + 1:end]
 		if b":" not in s:
 			raise ValueError("No ':' in section header %r" % (s))
 
-		s = s.decode("utf-8")
-		priority, type = s.split(":")
-		return priority, type
+		priority, type = s.decode("utf-8").split(":")
+		return int(priority), type, end + 2
 
-	def parseSectionBody(self, file):
+	def parseSectionBody(self, buf, pos):
 		"""
 		Parse line of a section
 		[ indent ] ">" start-offset "=" value [ "&" mask ] [ "~" word-size ] [ "+" range-length ] "\n"
+		Returns the rule and the position of the next line.
 		"""
-		indent = None
-		c = file.read(1)
-		if not c:
-			raise ValueError("Early EOF")
+		match = _ruleHead(buf, pos)
+		if match is None:
+			raise ValueError("Bad rule in section body at offset %i: %r" % (pos, buf[pos:pos + 16]))
 
-		if c != b">":
-			file.seek(-1, os.SEEK_CUR)
-			indent = self.readNumber(file)
-			c = file.read(1)
-			if c != b">":
-				raise ValueError("Missing '>' in section body (got %r)" % (c))
+		indent, startOffset, valueLength = match.groups()
+		valueLength, = struct.unpack(">H", valueLength)
+		pos = match.end() + valueLength
+		value = buf[pos - valueLength:pos]
 
-		startOffset = self.readNumber(file)
+		mask = None
+		if buf[pos:pos + 1] == b"&":
+			mask = buf[pos + 1:pos + 1 + valueLength]
+			pos += 1 + valueLength
 
-		c = file.read(1)
+		match = _ruleTail(buf, pos)
+		if match is None:
+			raise ValueError("Unexpected EOF in section body")
+		wordSize, rangeLength = match.groups()
 
-		if c != b"=":
-			raise ValueError("Missing '=' in %r section body (got %r)" % (file.name, c))
+		return self.Magic(int(indent or 0), int(startOffset), value, mask, int(wordSize or 1), int(rangeLength or 1)), match.end()
 
-		valueLength, = struct.unpack(">H", file.read(2))
-		value = file.read(valueLength)
-
-		invalidLine = False
-		c = file.read(1)
-		while True:
-			if c == b"\n":
-				# Done with the section
-				break
-			elif c == b"&":
-				match = file.read(valueLength)
-				break
-			elif c == b"~":
-				wordSize = self.readNumber(file)
-				break
-			elif c == b"+":
-				rangeLength = self.readNumber(file)
-				break
-			elif not c:
-				raise ValueError("Unexpected EOF in section body")
-			else:
-				raise ValueError("Unexpected character in section body: %r" % (c))
-
-			# TODO unknown character, see kmimetyperepository.cpp
-
-		return self.Magic(indent, startOffset, valueLength, value)
 
-
-MAGIC = MagicFile()
-for f in xdg.getFiles("mime/magic"):
-	MAGIC.parse(f)
+MAGIC = xdg.LazyTable(_loadTable, MagicFile, MagicFile.fromCaches, "mime/magic")
 
 
 class SubclassesFile(BaseFile):
@@ -284,14 +795,219 @@ class SubclassesFile(BaseFile):
 					self._keys[mime] = []
 				self._keys[mime].append(subclass)
 
-SUBCLASSES = SubclassesFile()
-for f in xdg.getFiles("mime/subclasses"):
-	SUBCLASSES.parse(f)
+SUBCLASSES = xdg.LazyTable(_loadTable, SubclassesFile, cache.CacheSubclasses, "mime/subclasses")
+
+
+class AncestorsTable(object):
+	"""
+	The ancestors of every MIME type, computed once per type from the
+	subclasses and aliases tables: its parents, theirs and so on, plus the
+	implicit parents the spec defines. Every text/* type is a kind of
+	text/plain, and every streamable one a kind of application/octet-stream.
+	"""
+	def __init__(self):
+		self._canonical = {}
+		self._ordered = {}
+		self._sets = {}
+
+	def unalias(self, name):
+		ret = self._canonical.get(name)
+		if ret is None:
+			ret = self._canonical[name] = ALIASES.get(name) or name
+		return ret
+
+	def _walk(self, names, seen, ret):
+		# Breadth first, so that the nearest ancestors come first
+		for name in names:
+			for parent in SUBCLASSES.get(name, []):
+				parent = self.unalias(parent)
+				if parent not in seen:
+					seen.add(parent)
+					ret.append(parent)
+					names.append(parent)
+
+	def ordered(self, name):
+		"""
+		Returns the ancestors of name, nearest first and implicit ones last
+		"""
+		name = self.unalias(name)
+		ret = self._ordered.get(name)
+		if ret is None:
+			seen = set([name])
+			ret = []
+			self._walk([name], seen, ret)
+
+			text = BaseMime.DEFAULT_TEXT
+			if text not in seen and any(mime.startswith("text/") for mime in seen):
+				seen.add(text)
+				ret.append(text)
+				self._walk([text], seen, ret)
+
+			binary = BaseMime.DEFAULT_BINARY
+			if binary not in seen and not name.startswith(("inode/", "x-scheme-handler/")):
+				ret.append(binary)
+
+			ret = self._ordered[name] = tuple([MimeType(mime) for mime in ret])
+		return ret
+
+	def get(self, name):
+		ret = self._sets.get(name)
+		if ret is None:
+			ret = self._sets[name] = frozenset(self.ordered(name))
+		return ret
+
+	def isInstance(self, name, other):
+		other = self.unalias(other)
+		return self.unalias(name) == other or other in self.get(name)
+
+ANCESTORS = xdg.LazyTable(AncestorsTable)
+
+
+class MimeInfo(object):
+	"""
+	What the XML description of a MIME type holds beyond the generated
+	tables. Localized texts are keyed by language, "en" standing for the
+	untranslated one.
+	"""
+	__slots__ = ("comments", "acronyms", "expandedAcronyms", "aliases", "icon", "genericIcon")
+
+	def __init__(self):
+		self.comments = {}
+		self.acronyms = {}
+		self.expandedAcronyms = {}
+		self.aliases = []
+		self.icon = None
+		self.genericIcon = None
+
+	def __repr__(self):
+		return "<MimeInfo: %r>" % (self.comments.get("en"))
+
+class MetadataFile(BaseFile):
+	"""
+	/usr/share/mime/<type>/<subtype>.xml
+	/usr/share/mime/packages/*.xml
+
+	Types are looked up in their own XML files on first use; parsePackages
+	reads every type at once instead. Either way each file is parsed once,
+	with a streaming parser, and everything the lookups need is kept.
+	"""
+	def get(self, name, default=None):
+		if name not in self._keys:
+			if statistics.ENABLED:
+				statistics.count("metadata.miss")
+			type, _, subtype = name.partition("/")
+			for path in reversed(xdg.getFiles(os.path.join("mime", type, "%s.xml" % (subtype)))):
+				self.parse(path)
+			# Remember misses too
+			self._keys.setdefault(name, None)
+		elif statistics.ENABLED:
+			statistics.count("metadata.hit")
+
+		ret = self._keys[name]
+		if ret is None:
+			return default
+		return ret
+
+	def parse(self, path):
+		"""
+		Parse a file holding a single <mime-type> or a <mime-info> package
+		of them. Later files override the texts of earlier ones.
+		"""
+		from xml.etree.ElementTree import iterparse
+		start = statistics.clock()
+		ns = "{%s}" % (xdg.FREEDESKTOP_NS)
+		lang = "{http://www.w3.org/XML/1998/namespace}lang"
+		texts = {
+			ns + "comment": "comments",
+			ns + "acronym": "acronyms",
+			ns + "expanded-acronym": "expandedAcronyms",
+		}
+
+		root = info = None
+		for event, element in iterparse(path, events=("start", "end")):
+			tag = element.tag
+			if event == "start":
+				if root is None:
+					root = element
+				if tag == ns + "mime-type":
+					info = self._keys.get(element.get("type"))
+					if info is None:
+						info = self._keys[element.get("type")] = MimeInfo()
+				continue
+
+			if info is None:
+				continue
+			elif tag in texts:
+				getattr(info, texts[tag])[element.get(lang, "en")] = (element.text or "").strip()
+			elif tag == ns + "alias":
+				if element.get("type") not in info.aliases:
+					info.aliases.append(element.get("type"))
+			elif tag == ns + "icon":
+				info.icon = element.get("name")
+			elif tag == ns + "generic-icon":
+				info.genericIcon = element.get("name")
+			elif tag == ns + "mime-type":
+				info = None
+				# Packages hold hundreds of types, don't keep their trees
+				root.clear()
+
+		if start is not None:
+			statistics.count("metadata.files")
+			statistics.timing("load." + path, start)
+
+	def parsePackages(self):
+		for base in reversed(xdg.getFiles(os.path.join("mime", "packages"))):
+			for name in sorted(os.listdir(base)):
+				if name.endswith(".xml"):
+					self.parse(os.path.join(base, name))
+
+METADATA = xdg.LazyTable(MetadataFile)
+
+# Bytes found in text, as opposed to binary data (after file(1))
+TEXT_CHARS = bytes(bytearray([7, 8, 9, 10, 12, 13, 27]) + bytearray(range(0x20, 0x7f)) + bytearray(range(0x80, 0x100)))
+
+# Bytes looksLikeText looks at
+TEXT_EXTENT = 128
+
+def looksLikeText(data):
+	return not bytes(data[:TEXT_EXTENT]).translate(None, TEXT_CHARS)
+
+def sniffExtent():
+	"""
+	Returns how many leading bytes of a file sniffing looks at: as many as
+	the magic rules can reach, and at least as many as looksLikeText, for
+	databases with few or no rules
+	"""
+	return max(MAGIC.extent(), TEXT_EXTENT)
+
+# Results of fromName by name, and of fromContent by (device, inode, size,
+# mtime). Disabled until given a capacity, with resize(). They are cleared
+# when the database is refreshed.
+NAMES = xdg.LRUCache("names")
+CONTENTS = xdg.LRUCache("contents")
+
+# Distinct names fromNames and fromPaths remember the matches of, forgetting
+# them all when full so that endless streams run in bounded memory
+BATCH_MEMO = 4096
+
+def preload(metadata=False):
+	"""
+	Load every table now rather than on first use. If metadata is True,
+	the comments and aliases of every type are read as well.
+	"""
+	from . import actions
+	for table in (ALIASES, GLOBS, ICONS, MAGIC, SUBCLASSES, ANCESTORS, actions.ACTIONS, actions.CACHE, actions.RESOLVER):
+		table.load()
+
+	if metadata:
+		METADATA.parsePackages()
+
 
 class MimeType(BaseMime):
 	"""
 	XDG-based MimeType
 	"""
+	__slots__ = ()
 
 	@staticmethod
 	def installPackage(package, base=os.path.join(xdg.XDG_DATA_HOME, "mime")):
@@ -304,58 +1020,251 @@ class MimeType(BaseMime):
 
 	@classmethod
 	def fromName(cls, name):
-		mime = GLOBS.match(name)
+		if NAMES.capacity:
+			mime = NAMES.get(name)
+			if mime is None:
+				mime = GLOBS.match(name)
+				NAMES.set(name, mime)
+		else:
+			mime = GLOBS.match(name)
+
 		if mime:
 			return cls(mime)
 
+	@classmethod
+	def fromNames(cls, names):
+		"""
+		Like fromName for every name in names, yielding the results in order.
+		Names seen again within BATCH_MEMO distinct names are not matched
+		again.
+		"""
+		results = {}
+		for name in names:
+			if name not in results:
+				if len(results) >= BATCH_MEMO:
+					results.clear()
+				mime = GLOBS.match(name)
+				results[name] = mime and cls(mime) or None
+			yield results[name]
+
 	@classmethod
 	def fromContent(cls, name):
 		try:
-			size = os.stat(name).st_size
+			st = os.stat(name)
 		except IOError:
 			return
 
+		if not CONTENTS.capacity:
+			return cls._fromContent(name, st.st_size)
+
+		# Any change to the file changes its mtime, or replaces its inode
+		key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime)
+		ret = CONTENTS.get(key)
+		if ret is None:
+			ret = cls._fromContent(name, st.st_size)
+			if ret is not None:
+				CONTENTS.set(key, ret.name())
+			return ret
+		return cls(ret)
+
+	@classmethod
+	def _fromContent(cls, name, size):
 		if size == 0:
 			return cls(cls.ZERO_SIZE)
 
-	def aliases(self):
-		if not self._aliases:
-			files = xdg.getFiles(os.path.join("mime", self.type(), "%s.xml" % (self.subtype())))
-			if not files:
-				return
+		try:
+			with open(name, "rb") as file:
+				data = file.read(sniffExtent())
+		except IOError:
+			return
+
+		return cls._fromData(data)
+
+	@classmethod
+	def fromBytes(cls, data, name=None):
+		"""
+		Classify data, the content of a file, and optionally its name,
+		without touching the filesystem. data can be bytes, an mmap or any
+		object supporting the buffer protocol; bytes and mmaps are sniffed
+		in place, other buffers through a copy of the bytes the magic rules
+		can look at. As with fromPath, data is only sniffed when the name
+		matches no glob or several conflicting ones.
+		"""
+		globs = name and GLOBS.matchAll(name) or []
+		if len(globs) == 1:
+			return cls(globs[0])
+
+		if not isinstance(data, (bytes, mmap.mmap)):
+			# Lookups need bytes: memoryview slices are unhashable and
+			# have no find()
+			view = memoryview(data)
+			if view.ndim != 1 or view.itemsize != 1:
+				view = view.cast("B")
+			data = view[:sniffExtent()].tobytes()
+
+		if not len(data):
+			return cls._combine(cls(cls.ZERO_SIZE), globs)
+		return cls._combine(cls._fromData(data), globs)
+
+	@classmethod
+	def fromStream(cls, file, name=None):
+		"""
+		Like fromBytes, for the data file, a binary file-like object, yields.
+		At most sniffExtent() bytes are read from it, and none if name is
+		enough; file is left past them.
+		"""
+		globs = name and GLOBS.matchAll(name) or []
+		if len(globs) == 1:
+			return cls(globs[0])
+
+		# Streams such as sockets and pipes may return less than asked for
+		chunks = []
+		remaining = sniffExtent()
+		while remaining > 0:
+			chunk = file.read(remaining)
+			if not chunk:
+				break
+			chunks.append(chunk)
+			remaining -= len(chunk)
+
+		if not chunks:
+			return cls._combine(cls(cls.ZERO_SIZE), globs)
+		return cls._combine(cls._fromData(b"".join(chunks)), globs)
+
+	@classmethod
+	def _fromData(cls, data):
+		"""
+		Sniff the leading bytes of a file, at least sniffExtent() of them
+		unless the file is shorter. Whether the file is empty is up to the
+		caller, which knows its size.
+		"""
+		mime = MAGIC.match(data)
+		if statistics.ENABLED:
+			statistics.count("sniff.files")
+			statistics.count("sniff.bytes", len(data))
+			statistics.count(mime and "sniff.magic" or looksLikeText(data) and "sniff.text" or "sniff.binary")
+
+		if mime:
+			return cls(mime)
+
+		if looksLikeText(data):
+			return cls(cls.DEFAULT_TEXT)
+
+		return cls(cls.DEFAULT_BINARY)
+
+	@classmethod
+	def fromPath(cls, path):
+		"""
+		Classify a file as the shared-mime-info spec recommends: by inode
+		type, then by name, only sniffing the content when no glob or
+		several conflicting globs match.
+		"""
+		try:
+			st = os.stat(path)
+		except IOError:
+			return
+
+		return cls._fromStat(path, st, GLOBS.matchAll(os.path.basename(path)))
+
+	@classmethod
+	def _fromStat(cls, path, st, globs, content=True):
+		mime = cls.fromMode(path, st.st_mode)
+		if mime:
+			return mime
 
-			for file in files:
-				doc = minidom.parse(file)
-				for node in doc.documentElement.getElementsByTagName("alias"):
-					alias = node.getAttribute("type")
-					if alias not in self._aliases:
-						self._aliases.append(alias)
+		if len(globs) == 1 or not content:
+			return globs and cls(globs[0]) or None
 
-		return self._aliases
+		return cls._fromGlobs(path, st.st_size, globs)
+
+	@classmethod
+	def _fromGlobs(cls, path, size, globs):
+		"""
+		Sniff a regular file whose name matched no glob or several
+		conflicting ones, and reconcile the result with those globs.
+		"""
+		return cls._combine(cls._fromContent(path, size), globs)
+
+	@classmethod
+	def _combine(cls, mime, globs):
+		if mime is None or mime.isDefault() or mime == cls.ZERO_SIZE:
+			# Magic found nothing, the name is still a better guess
+			if globs:
+				return cls(globs[0])
+			return mime
+
+		# Prefer a glob that is a kind of what the magic found
+		for glob in globs:
+			if cls(glob).isInstance(mime):
+				return cls(glob)
+
+		return mime
+
+	@classmethod
+	def fromPaths(cls, paths, content=True):
+		"""
+		Like fromPath for every path in paths, yielding the results in order.
+		Paths can be strings or os.DirEntry objects from os.scandir, whose
+		cached stat is reused; strings are stat'ed once. File names are
+		remembered like in fromNames, and the content is only sniffed when
+		content is True and the name is ambiguous.
+		"""
+		matches = {}
+		for path in paths:
+			try:
+				if isinstance(path, basestring):
+					name = os.path.basename(path)
+					st = os.stat(path)
+				else:
+					name = path.name
+					st = path.stat()
+					path = path.path
+			except (IOError, OSError):
+				yield None
+				continue
+
+			if name not in matches:
+				if len(matches) >= BATCH_MEMO:
+					matches.clear()
+				matches[name] = GLOBS.matchAll(name)
+
+			yield cls._fromStat(path, st, matches[name], content)
+
+	def acronym(self, lang="en"):
+		info = METADATA.get(self._name)
+		if info is not None:
+			return info.acronyms.get(lang)
+
+	def aliases(self):
+		info = METADATA.get(self._name)
+		if info is not None:
+			return info.aliases
 
 	def aliasOf(self):
 		return ALIASES.get(self.name())
 
 	def comment(self, lang="en"):
-		if lang not in self._comment:
-			files = xdg.getFiles(os.path.join("mime", self.type(), "%s.xml" % (self.subtype())))
-			if not files:
-				return
-
-			for file in files:
-				doc = minidom.parse(file)
-				for comment in doc.documentElement.getElementsByTagNameNS(xdg.FREEDESKTOP_NS, "comment"):
-					nslang = comment.getAttributeNS(XML_NAMESPACE, "lang") or "en"
-					if nslang == lang:
-						self._comment[lang] = "".join(n.nodeValue for n in comment.childNodes).strip()
-						break
-
-		if lang in self._comment:
-			return self._comment[lang]
+		info = METADATA.get(self._name)
+		if info is not None:
+			return info.comments.get(lang)
+
+	def expandedAcronym(self, lang="en"):
+		info = METADATA.get(self._name)
+		if info is not None:
+			return info.expandedAcronyms.get(lang)
 
 	def genericIcon(self):
 		return ICONS.get(self.name()) or super(MimeType, self).genericIcon()
 
+	def ancestors(self):
+		"""
+		Returns the frozenset of every type this type is a kind of
+		"""
+		return ANCESTORS.get(self._name)
+
+	def isInstance(self, other):
+		return self == other or ANCESTORS.isInstance(self._name, str(other))
+
 	def subClassOf(self):
 		return [MimeType(mime) for mime in SUBCLASSES.get(self.name(), [])]
 
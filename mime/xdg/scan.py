@@ -0,0 +1,124 @@
+"""
+Parallel classification of a directory tree
+"""
+
+import os
+import stat
+from .mime import GLOBS, MimeType
+
+
+def listDirectory(path):
+	"""
+	Returns a (path, name, stat, isSymlink) tuple for every entry of the
+	directory at path. Symbolic links are stat'ed through, unless they
+	dangle; stat is None for entries that can't be stat'ed at all.
+	"""
+	ret = []
+	try:
+		entries = os.scandir(path)
+	except OSError:
+		return ret
+
+	with entries:
+		for entry in entries:
+			try:
+				st = entry.stat()
+			except OSError:
+				try:
+					st = entry.stat(follow_symlinks=False)
+				except OSError:
+					st = None
+			ret.append((entry.path, entry.name, st, entry.is_symlink()))
+
+	return ret
+
+def classify(path, name, st, isSymlink, device, matches, content=True):
+	"""
+	Classify an entry listDirectory returned, without reading it.
+	device is the st_dev of the directory holding it, and matches a dict
+	memoizing the globs matching each name.
+	Returns a (mime, descend, globs) tuple: descend is True for directories
+	to walk into, and globs is not None for files that still have to be
+	sniffed and reconciled with those globs, see MimeType._fromGlobs.
+	"""
+	if st is None:
+		return None, False, None
+
+	mode = st.st_mode
+	if stat.S_ISDIR(mode):
+		if isSymlink:
+			return MimeType("inode/directory"), False, None
+		if st.st_dev != device:
+			# Same test as os.path.ismount, without its two stat calls
+			return MimeType("inode/mount-point"), False, None
+		return MimeType("inode/directory"), True, None
+
+	if not stat.S_ISREG(mode):
+		return MimeType.fromMode(path, mode), False, None
+
+	if name not in matches:
+		matches[name] = GLOBS.matchAll(name)
+	globs = matches[name]
+
+	if len(globs) == 1 or not content:
+		return globs and MimeType(globs[0]) or None, False, None
+
+	return None, False, globs
+
+
+def scan(root, workers=4, content=True):
+	"""
+	Walk the tree under root and yield a (path, MimeType) tuple for every
+	entry in it, as results arrive.
+	Inode types come from the stat os.scandir caches, and every file is
+	matched by name first. Only files whose name is ambiguous are sniffed,
+	when content is True, by a pool of workers threads, so that their
+	reads overlap. Symbolic links are classified by their target but
+	never followed into.
+	"""
+	from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+	matches = {}
+	pending = set()
+	# Bound the reads in flight, and the results waiting to be yielded
+	limit = workers * 4
+
+	def drain(block):
+		done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+		for future in done:
+			pending.remove(future)
+			yield future.result()
+
+	def sniff(path, size, globs):
+		return path, MimeType._fromGlobs(path, size, globs)
+
+	with ThreadPoolExecutor(workers) as pool:
+		try:
+			dirs = [(root, os.stat(root).st_dev)]
+		except OSError:
+			return
+
+		while dirs:
+			base, device = dirs.pop()
+			for path, name, st, isSymlink in listDirectory(base):
+				mime, descend, globs = classify(path, name, st, isSymlink, device, matches, content)
+				if descend:
+					dirs.append((path, device))
+
+				if globs is None:
+					yield path, mime
+					continue
+
+				pending.add(pool.submit(sniff, path, st.st_size, globs))
+				if len(pending) >= limit:
+					for result in drain(True):
+						yield result
+
+			# Hand over whatever is ready between directories
+			if pending:
+				for result in drain(False):
+					yield result
+
+		while pending:
+			for result in drain(True):
+				yield result
@@ -0,0 +1,208 @@
+"""
+Persistent snapshot of the parsed tables, so that new processes don't parse
+the same files over again.
+
+The snapshot is a single pickle under $XDG_CACHE_HOME, read in one go on
+first use. It is keyed by the path, mtime and size of every file the tables
+are built from, and discarded when any of them changes; tables are then
+built as usual and the snapshot is rewritten at exit. Tables built from
+whole directory trees also keep the stamp of the trees, and are rebuilt
+alone when it changes.
+"""
+
+import os
+import sys
+import threading
+from . import xdg
+from .. import statistics
+
+VERSION = 2
+
+# Set to False to neither read nor write snapshots
+ENABLED = True
+
+# What the tables are built from. Directories are included for their mtime,
+# which changes when files are added to or removed from them.
+SOURCES = (
+	"mime",
+	"mime/aliases",
+	"mime/generic-icons",
+	"mime/globs2",
+	"mime/magic",
+	"mime/mime.cache",
+	"mime/subclasses",
+	"applications/mimeapps.list",
+	"applications/mimeinfo.cache",
+)
+
+# Modules defining the pickled classes. A snapshot taken by other code
+# would unpickle into objects the current one doesn't expect.
+MODULES = ("actions.py", "cache.py", "mime.py", "xdg.py")
+
+
+def getPath():
+	return os.path.join(xdg.XDG_CACHE_HOME, "python-mime", "snapshot-%i-py%i.%i" % ((VERSION, ) + tuple(sys.version_info[:2])))
+
+def getKey():
+	"""
+	Returns the key of the snapshot of the current files, or None if the
+	modules can't be stat'ed, as when imported from a zip or installed
+	without sources: there is then no telling which code took a snapshot.
+	"""
+	ret = []
+	for name in MODULES:
+		try:
+			st = os.stat(os.path.join(os.path.dirname(__file__), name))
+		except OSError:
+			return
+		ret.append((name, st.st_mtime, st.st_size))
+	return tuple(ret) + xdg.stampFiles(SOURCES)
+
+
+class Snapshot(object):
+	"""
+	~/.cache/python-mime/snapshot-<version>-py<python version>
+
+	With a key of None, it is never read nor written.
+	"""
+
+	def __init__(self, path, key):
+		self.path = path
+		self.key = key
+		self._tables = {}
+		# Stamps of the trees tables were built from, by name
+		self._stamps = {}
+		self._dirty = False
+		self._lock = threading.Lock()
+
+	def __repr__(self):
+		return "<Snapshot: %s %r>" % (self.path, sorted(self._tables))
+
+	def get(self, name, build, trees=()):
+		"""
+		Returns the table called name, calling build() to make it if the
+		snapshot doesn't hold it yet, or if the table is built from trees,
+		directories looked into with everything below them, and they
+		changed since
+		"""
+		stamp = None
+		if trees:
+			stamp = ()
+			for tree in trees:
+				stamp += xdg.stampDirectories(tree)
+
+		ret = self._tables.get(name)
+		if ret is not None and self._stamps.get(name) != stamp:
+			ret = None
+		if ret is None:
+			from .cache import CacheTable
+			ret = build()
+			if isinstance(ret, CacheTable):
+				# Views on the mmapped mime.cache, already as cheap as it gets
+				return ret
+			if statistics.ENABLED:
+				statistics.count("snapshot.miss")
+
+			with self._lock:
+				self._tables[name] = ret
+				if stamp is not None:
+					self._stamps[name] = stamp
+				if not self._dirty:
+					self._dirty = True
+					if ENABLED and self.key is not None:
+						import atexit
+						atexit.register(self._saveAtExit)
+
+		elif statistics.ENABLED:
+			statistics.count("snapshot.hit")
+		return ret
+
+	def clear(self):
+		"""
+		Forget the tables, after the files they were built from changed, so
+		that they are built again. Tables built from then on are saved under
+		the key of the current files.
+		"""
+		with self._lock:
+			self._tables.clear()
+			self._stamps.clear()
+			if self.key is not None:
+				self.key = getKey()
+
+	def load(self):
+		"""
+		Read the snapshot. Returns False, leaving it empty, if it is
+		missing, unreadable or was taken from other files.
+		"""
+		if self.key is None:
+			return False
+
+		try:
+			import cPickle as pickle
+		except ImportError:
+			import pickle
+		from io import BytesIO
+
+		try:
+			with open(self.path, "rb") as file:
+				file = BytesIO(file.read())
+			if pickle.load(file) != (VERSION, self.key):
+				return False
+			tables, stamps = pickle.load(file)
+		except Exception:
+			# Whatever the reason, a snapshot is only worth what it saves
+			return False
+
+		with self._lock:
+			self._tables.update(tables)
+			self._stamps.update(stamps)
+		return True
+
+	def _saveAtExit(self):
+		# The files may have changed since the tables were built
+		if self.key == getKey():
+			self.save()
+
+	def save(self):
+		"""
+		Write the snapshot if tables were built since it was read, replacing
+		the previous one atomically. Failures are ignored, the next process
+		will simply parse the files.
+		"""
+		try:
+			import cPickle as pickle
+		except ImportError:
+			import pickle
+
+		with self._lock:
+			if not self._dirty or self.key is None:
+				return
+			tables = dict(self._tables)
+			stamps = dict(self._stamps)
+			self._dirty = False
+
+		base = os.path.dirname(self.path)
+		temp = "%s.%i" % (self.path, os.getpid())
+		try:
+			if base and not os.path.exists(base):
+				os.makedirs(base)
+			with open(temp, "wb") as file:
+				pickle.dump((VERSION, self.key), file, pickle.HIGHEST_PROTOCOL)
+				pickle.dump((tables, stamps), file, pickle.HIGHEST_PROTOCOL)
+			os.rename(temp, self.path)
+		except Exception:
+			try:
+				os.remove(temp)
+			except OSError:
+				pass
+
+
+def openSnapshot():
+	ret = Snapshot(getPath(), getKey())
+	if ENABLED:
+		start = statistics.clock()
+		ret.load()
+		statistics.timing("load.snapshot", start)
+	return ret
+
+SNAPSHOT = xdg.LazyTable(openSnapshot)
@@ -3,36 +3,95 @@ Shared definitions and helper functions for xdg
 """
 
 import os
-try:
-	from configparser import RawConfigParser
-except ImportError:
-	from ConfigParser import RawConfigParser
+import threading
+from collections import OrderedDict
+from .. import statistics
 
 FREEDESKTOP_NS = "http://www.freedesktop.org/standards/shared-mime-info"
 
 HOME = os.path.expanduser("~")
 XDG_DATA_HOME = os.environ.get("XDG_DATA_HOME", os.path.join(HOME, ".local", "share"))
-XDG_DATA_DIRS = set([XDG_DATA_HOME] + os.environ.get("XDG_DATA_DIRS", "/usr/local/share:/usr/share").split(":"))
+# Most important first
+XDG_DATA_DIRS = [XDG_DATA_HOME]
+for dir in (os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share").split(":"):
+	if dir and dir not in XDG_DATA_DIRS:
+		XDG_DATA_DIRS.append(dir)
+del dir
+XDG_CACHE_HOME = os.environ.get("XDG_CACHE_HOME", os.path.join(HOME, ".cache"))
 # XDG_CONFIG_HOME = os.environ.get("XDG_CONFIG_HOME", os.path.join(HOME, ".config"))
 # XDG_CONFIG_DIRS = set([XDG_CONFIG_HOME] + os.environ.get("XDG_CONFIG_DIRS", "/etc/xdg").split(":"))
-# XDG_CACHE_HOME  = os.environ.get("XDG_CACHE_HOME", os.path.join(HOME, ".cache"))
 
 
+# Paths getFiles resolved, by name
+_files = {}
+
 def getFiles(name):
+	"""
+	Returns the paths name exists at in the data directories, most
+	important first. Each name is only resolved once, until
+	invalidateFiles is called.
+	"""
+	ret = _files.get(name)
+	if ret is None:
+		ret = []
+		for dir in XDG_DATA_DIRS:
+			path = os.path.join(dir, name)
+			if os.path.exists(path):
+				ret.append(path)
+		_files[name] = ret
+	return list(ret)
+
+def invalidateFiles():
+	"""
+	Forget the paths getFiles resolved, after files were added or removed
+	or XDG_DATA_DIRS changed
+	"""
+	_files.clear()
+
+def stampFiles(names):
+	"""
+	Returns the path, mtime and size of every file the names resolve to.
+	Two stamps differ if any of the files was changed, added or removed.
+	"""
 	ret = []
-	for dir in XDG_DATA_DIRS:
-		path = os.path.join(dir, name)
-		if os.path.exists(path):
-			ret.append(path)
-	return ret
+	for name in names:
+		for path in getFiles(name):
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			ret.append((path, st.st_mtime, st.st_size))
+	return tuple(ret)
 
-def getDesktopFilePath(name):
-	ret = None
-	for path in getFiles(os.path.join("applications", name)):
-		if os.path.exists(path):
-			ret = path
+def stampDirectories(name):
+	"""
+	Returns the path and mtime of every directory name resolves to and of
+	every directory below them, as DesktopFileIndex walks them, so that
+	adding or removing a file anywhere in the trees changes the stamp
+	"""
+	ret = []
+	for base in getFiles(name):
+		visited = set()
+		stack = [base]
+		while stack:
+			path = stack.pop()
+			try:
+				st = os.stat(path)
+				if (st.st_dev, st.st_ino) in visited:
+					continue
+				visited.add((st.st_dev, st.st_ino))
+				ret.append((path, st.st_mtime))
+				with os.scandir(path) as entries:
+					stack += sorted((entry.path for entry in entries if entry.is_dir()), reverse=True)
+			except OSError:
+				continue
+	return tuple(ret)
 
-	return ret
+def getDesktopFilePath(name):
+	"""
+	Returns the path of the desktop file with the ID name, or None
+	"""
+	return DESKTOP_FILES.get(name.replace("/", "-"))
 
 def updateDesktopDatabase(base):
 	from subprocess import Popen
@@ -49,11 +108,198 @@ class IniFile(object):
 	def __repr__(self):
 		return self.keys.__repr__()
 
+	def __getstate__(self):
+		# The parser is only needed while parsing
+		ret = self.__dict__.copy()
+		ret.pop("cfg", None)
+		return ret
+
 	def get(self, key, default=None):
 		return self.keys.get(key, default)
 
 	def parse(self, path):
+		try:
+			from configparser import RawConfigParser
+		except ImportError:
+			from ConfigParser import RawConfigParser
+
 		with open(path, "r") as file:
 			self.cfg = RawConfigParser()
 			self.cfg.readfp(file)
 			self.parseKeys()
+
+
+class LazyTable(object):
+	"""
+	Proxy for a table that is only built on first use.
+	The loader is called at most once, even with concurrent first accesses,
+	until the table is reloaded. If sources, the names of the files the
+	table is built from, or trees, the names of the directories it is built
+	from with everything below them, are set, their stamp is kept in stamp.
+	"""
+	sources = ()
+	trees = ()
+
+	def __init__(self, loader, *args):
+		self._loader = loader
+		self._args = args
+		self._lock = threading.Lock()
+		self._loaded = False
+		self._table = None
+		self.stamp = None
+
+	def __getattr__(self, name):
+		return getattr(self.load(), name)
+
+	def __repr__(self):
+		return repr(self.load())
+
+	def getStamp(self):
+		"""
+		Returns the current stamp of the sources and trees
+		"""
+		ret = stampFiles(self.sources)
+		for name in self.trees:
+			ret += stampDirectories(name)
+		return ret
+
+	def _build(self):
+		# Stamp first: a change made while loading is seen by the next check
+		stamp = None
+		if self.sources or self.trees:
+			stamp = self.getStamp()
+		self._table = self._loader(*self._args)
+		self.stamp = stamp
+		self._loaded = True
+
+	def isLoaded(self):
+		return self._loaded
+
+	def load(self):
+		if not self._loaded:
+			with self._lock:
+				if not self._loaded:
+					self._build()
+		return self._table
+
+	def reload(self):
+		"""
+		Build the table again. Until the new one is ready, readers keep
+		using the previous one.
+		"""
+		with self._lock:
+			self._build()
+		return self._table
+
+
+class LRUCache(object):
+	"""
+	Mapping keeping at most capacity items, forgetting the least recently
+	used first. With a capacity of 0, the default, it keeps nothing and
+	callers should skip it altogether.
+	Hits, misses and evictions are counted, and reported to statistics as
+	<name>.hit, <name>.miss and <name>.eviction.
+	"""
+	def __init__(self, name, capacity=0):
+		self.name = name
+		self.capacity = capacity
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._items = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __repr__(self):
+		return "<LRUCache %s: %i/%i>" % (self.name, len(self._items), self.capacity)
+
+	def __len__(self):
+		return len(self._items)
+
+	def get(self, key, default=None):
+		with self._lock:
+			hit = key in self._items
+			if hit:
+				# Most recently used last
+				ret = self._items[key] = self._items.pop(key)
+				self.hits += 1
+			else:
+				ret = default
+				self.misses += 1
+
+		if statistics.ENABLED:
+			statistics.count(self.name + (hit and ".hit" or ".miss"))
+		return ret
+
+	def set(self, key, value):
+		evicted = 0
+		with self._lock:
+			self._items.pop(key, None)
+			self._items[key] = value
+			while len(self._items) > self.capacity:
+				self._items.popitem(last=False)
+				evicted += 1
+			self.evictions += evicted
+
+		if evicted and statistics.ENABLED:
+			statistics.count(self.name + ".eviction", evicted)
+
+	def resize(self, capacity):
+		"""
+		Change the capacity, evicting what no longer fits
+		"""
+		with self._lock:
+			self.capacity = capacity
+			while len(self._items) > capacity:
+				self._items.popitem(last=False)
+				self.evictions += 1
+
+	def clear(self):
+		with self._lock:
+			self._items.clear()
+
+
+class DesktopFileIndex(object):
+	"""
+	Every desktop file in the applications directories, by desktop file ID.
+	As the desktop entry spec requires, the IDs of files in subdirectories
+	are prefixed with them: applications/kde4/kate.desktop is
+	kde4-kate.desktop. Directories searched first hide the files of later
+	ones with the same ID.
+	"""
+	def __init__(self, dirs=None):
+		self._paths = {}
+		if dirs is None:
+			dirs = getFiles("applications")
+		for base in dirs:
+			self._scan(base, "", set())
+
+	def __repr__(self):
+		return self._paths.__repr__()
+
+	def _scan(self, path, prefix, visited):
+		# Directories are identified by device and inode, so that symlinks
+		# looping back up the tree are only followed once
+		try:
+			st = os.stat(path)
+			if (st.st_dev, st.st_ino) in visited:
+				return
+			entries = os.scandir(path)
+		except OSError:
+			return
+		visited.add((st.st_dev, st.st_ino))
+
+		with entries:
+			for entry in entries:
+				try:
+					if entry.is_dir():
+						self._scan(entry.path, prefix + entry.name + "-", visited)
+						continue
+				except OSError:
+					continue
+				if entry.name.endswith(".desktop"):
+					self._paths.setdefault(prefix + entry.name, entry.path)
+
+	def get(self, name, default=None):
+		return self._paths.get(name, default)
+
+DESKTOP_FILES = LazyTable(DesktopFileIndex)
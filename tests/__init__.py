@@ -3,7 +3,14 @@
 Tests for python-mime
 
 >>> import os
+>>> import mime as mimemodule
 >>> from mime import MimeType
+
+Neither read nor write the snapshot of the user running the tests
+
+>>> from mime.xdg import snapshot
+>>> snapshot.ENABLED = False
+>>> mimemodule.preload()
 >>> mime = MimeType.fromName("foo.txt")
 >>> mime.name()
 'text/plain'
@@ -42,6 +49,15 @@ Tests for python-mime
 'video/x-matroska'
 >>> MimeType("application/javascript").aliases()
 ['application/x-javascript', 'text/javascript']
+>>> MimeType("text/plain").comment("fr")
+'document texte brut'
+>>> MimeType("text/plain").comment("xx")
+>>> MimeType("text/plain").comment()
+'plain text document'
+>>> MimeType("application/pdf").acronym()
+'PDF'
+>>> MimeType("application/pdf").expandedAcronym()
+'Portable Document Format'
 >>> MimeType("text/xml").aliasOf()
 'application/xml'
 >>> MimeType("text/x-python").subClassOf()
@@ -50,12 +66,42 @@ Tests for python-mime
 'package-x-generic'
 >>> MimeType("application/zip").icon()
 'application-zip'
+>>> MimeType("application/zip") is MimeType("application/zip")
+True
+>>> transient = MimeType("application/x-transient")
+>>> (MimeType, "application/x-transient") in MimeType._instances
+True
+>>> del transient
+>>> (MimeType, "application/x-transient") in MimeType._instances
+False
+>>> MimeType("application/zip").type(), MimeType("application/zip").subtype()
+('application', 'zip')
+>>> sorted(set([MimeType("text/plain"), MimeType("text/plain"), MimeType("text/html")]), key=str)
+[<MimeType: text/html>, <MimeType: text/plain>]
+>>> {MimeType("text/plain"): 1}["text/plain"]
+1
 >>> MimeType("text/plain").genericIcon()
 'text-x-generic'
 >>> MimeType("application/zip").isInstance("application/zip")
 True
 >>> MimeType("application/x-chrome-extension").isInstance("application/zip")
 True
+>>> MimeType("application/x-shellscript").isInstance("text/plain")
+True
+>>> MimeType("text/x-csrc").isInstance("text/plain")
+True
+>>> MimeType("image/png").isInstance("application/octet-stream")
+True
+>>> MimeType("image/png").isInstance("text/plain")
+False
+>>> MimeType("inode/directory").isInstance("application/octet-stream")
+False
+>>> MimeType("application/x-javascript").isInstance("application/javascript")
+True
+>>> "application/zip" in MimeType("application/vnd.oasis.opendocument.text").ancestors()
+True
+>>> sorted(MimeType("image/svg+xml").ancestors(), key=str)
+[<MimeType: application/octet-stream>, <MimeType: application/xml>, <MimeType: text/plain>]
 >>> MimeType("text/plain").isInstance("application/zip")
 False
 >>> MimeType.fromScheme("http://example.com").name()
@@ -71,6 +117,380 @@ False
 >>> MimeType.fromContent(f.name).name()
 'application/x-zerosize'
 >>> os.remove(f.name)
+>>> f = open("test.tmp", "wb")
+>>> _ = f.write(b"\\x89PNG\\r\\n\\x1a\\n" + b"\\0" * 24)
+>>> f.close()
+>>> MimeType.fromContent(f.name).name()
+'image/png'
+>>> MimeType.fromPath(f.name).name()
+'image/png'
+>>> os.rename(f.name, "test.txt")
+>>> MimeType.fromPath("test.txt").name()
+'text/plain'
+>>> os.remove("test.txt")
+>>> MimeType.fromContent("setup.py").name()
+'text/x-python'
+>>> MimeType.fromContent("README").name()
+'text/plain'
+>>> MimeType.fromPath("README").name()
+'text/x-readme'
+>>> MimeType.fromPath(".").name()
+'inode/directory'
+>>> list(MimeType.fromNames(["foo.txt", "foo.c", "foo.txt", "foo.does-not-exist"]))
+[<MimeType: text/plain>, <MimeType: text/x-csrc>, <MimeType: text/plain>, None]
+>>> plain, _, plain2, _ = MimeType.fromNames(["foo.txt", "foo.c", "bar.txt", "foo"])
+>>> plain is plain2
+True
+>>> mimemodule.xdg.mime.BATCH_MEMO = 2
+>>> [str(m) for m in MimeType.fromNames(["a.txt", "a.c", "a.png", "a.txt", "a.c"])]
+['text/plain', 'text/x-csrc', 'image/png', 'text/plain', 'text/x-csrc']
+>>> [str(m) for m in MimeType.fromPaths(["README", "setup.py", "mime/__init__.py", "README"])]
+['text/x-readme', 'text/x-python', 'text/x-python', 'text/x-readme']
+>>> mimemodule.xdg.mime.BATCH_MEMO = 4096
+>>> list(MimeType.fromPaths(["README", "setup.py", ".", "does-not-exist"]))
+[<MimeType: text/x-readme>, <MimeType: text/x-python>, <MimeType: inode/directory>, None]
+>>> sorted(set(mime.name() for mime in MimeType.fromPaths(os.scandir("mime"))))
+['inode/directory', 'text/x-python']
+
+>>> results = dict(mimemodule.scan("mime", workers=2))
+>>> results["mime/xdg/mime.py"]
+<MimeType: text/x-python>
+>>> results["mime/xdg"]
+<MimeType: inode/directory>
+>>> set(mime.name() for path, mime in mimemodule.scan("mime", content=False)) >= set(["inode/directory", "text/x-python"])
+True
+
+
+Tests for the globs2 parser
+
+>>> from mime.xdg.mime import GlobsFile
+>>> globs = GlobsFile()
+>>> globs.parse("/usr/share/mime/globs2")
+>>> globs.match("foo.C")
+'text/x-c++src'
+>>> globs.match("foo.c")
+'text/x-csrc'
+>>> globs.match("Foo~")
+'application/x-trash'
+>>> globs.match("libfoo.so.1")
+'application/x-sharedlib'
+>>> globs.match("README")
+'text/x-readme'
+>>> globs.match("foo.tar.gz")
+'application/x-compressed-tar'
+>>> globs.match("foo.TAR.GZ")
+'application/x-compressed-tar'
+>>> globs.match("foo.gz")
+'application/gzip'
+>>> globs.match("foo.html")
+'text/html'
+>>> globs.match("foo.does-not-exist")
+''
+
+Files parsed later, from more important directories, win ties
+
+>>> globs = GlobsFile()
+>>> _ = open("globs2.tmp", "w").write("50:text/x-system:*.foo\\n")
+>>> globs.parse("globs2.tmp")
+>>> _ = open("globs2.tmp", "w").write("50:text/x-user:*.foo\\n")
+>>> globs.parse("globs2.tmp")
+>>> globs.match("file.foo")
+'text/x-user'
+>>> globs.matchAll("file.foo")
+['text/x-user', 'text/x-system']
+>>> os.remove("globs2.tmp")
+
+Patterns of the same weight and length all match
+
+>>> globs = GlobsFile()
+>>> _ = open("globs2.tmp", "w").write("50:text/x-a:ab*\\n50:text/x-b:a*c\\n40:text/x-c:a*\\n")
+>>> globs.parse("globs2.tmp")
+>>> globs.matchAll("abc")
+['text/x-a', 'text/x-b']
+>>> globs.matchAll("ABC")
+['text/x-a', 'text/x-b']
+>>> globs.matchAll("abd")
+['text/x-a']
+>>> os.remove("globs2.tmp")
+
+Patterns are indexed by a literal they start with, end with or hold, and
+only those a name can match are tested
+
+>>> globs = GlobsFile()
+>>> lines = ["50:text/x-log%i:log-%i-*.txt\\n50:text/x-so%i:*.so%i.[0-9]*\\n50:text/x-mk%i:[Mm]akefile%i\\n" % ((i, ) * 6) for i in range(3000)]
+>>> _ = open("globs2.tmp", "w").write("".join(lines) + "60:text/x-any:*.[0-9]?\\n")
+>>> globs.parse("globs2.tmp")
+>>> globs.matchAll("log-42-x.txt"), globs.matchAll("libfoo.so7.1"), globs.matchAll("makefile2999")
+(['text/x-log42'], ['text/x-so7'], ['text/x-mk2999'])
+>>> globs.matchAll("libfoo.so7.12"), globs.matchAll("log-x.txt")
+(['text/x-any'], [])
+>>> os.remove("globs2.tmp")
+
+>>> from mime.xdg import xdg
+>>> xdg.XDG_DATA_DIRS[0] == xdg.XDG_DATA_HOME
+True
+>>> xdg.getFiles("mime") == [path for path in (os.path.join(base, "mime") for base in xdg.XDG_DATA_DIRS) if os.path.exists(path)]
+True
+
+
+Tests for the binary mime.cache
+
+>>> from mime.xdg import cache
+>>> caches = cache.openCaches(["/usr/share/mime"])
+>>> cache.CacheGlobs(caches).match("foo.tar.gz")
+'application/x-compressed-tar'
+>>> cache.CacheGlobs(caches).match("foo.TXT")
+'text/plain'
+>>> cache.CacheAliases(caches).get("text/xml")
+'application/xml'
+>>> from mime.xdg.mime import MagicFile
+>>> MagicFile.fromCaches(caches).match(b"%PDF-1.4")
+'application/pdf'
+
+Both backends rank literals, suffixes and patterns together, by weight then length
+
+>>> import shutil, subprocess, tempfile
+>>> base = os.path.join(tempfile.mkdtemp(), "mime")
+>>> os.makedirs(os.path.join(base, "packages"))
+>>> _ = open(os.path.join(base, "packages", "test.xml"), "w").write('''<?xml version="1.0"?>
+... <mime-info xmlns="http://www.freedesktop.org/standards/shared-mime-info">
+... <mime-type type="text/x-a"><glob pattern="data.bin" weight="10"/></mime-type>
+... <mime-type type="text/x-b"><glob pattern="*.bin" weight="90"/></mime-type>
+... <mime-type type="text/x-c"><glob pattern="*.tar.zz" weight="20"/></mime-type>
+... <mime-type type="text/x-d"><glob pattern="*.zz" weight="80"/></mime-type>
+... <mime-type type="text/x-e"><glob pattern="*.Cs" case-sensitive="true"/></mime-type>
+... <mime-type type="text/x-f"><glob pattern="*.cs"/></mime-type>
+... <mime-type type="text/x-g"><glob pattern="x*.lg"/></mime-type>
+... <mime-type type="text/x-h"><glob pattern="*y.l?"/></mime-type>
+... </mime-info>''')
+>>> subprocess.check_call(["update-mime-database", base], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+0
+>>> text = GlobsFile()
+>>> text.parse(os.path.join(base, "globs2"))
+>>> binary = cache.CacheGlobs(cache.openCaches([base]))
+>>> names = ["data.bin", "x.tar.zz", "x.zz", "DATA.BIN", "x.Cs", "x.CS", "x.cs"]
+>>> [text.match(name) for name in names]
+['text/x-b', 'text/x-d', 'text/x-d', 'text/x-b', 'text/x-e', 'text/x-f', 'text/x-f']
+>>> sorted(binary.matchAll("XY.LG")) == sorted(text.matchAll("XY.LG")) == ['text/x-g', 'text/x-h']
+True
+>>> [binary.match(name) for name in names] == [text.match(name) for name in names]
+True
+>>> [binary.matchAll(name) for name in names] == [text.matchAll(name) for name in names]
+True
+>>> shutil.rmtree(os.path.dirname(base))
+
+The same goes for the system database
+
+>>> text = GlobsFile()
+>>> text.parse("/usr/share/mime/globs2")
+>>> binary = cache.CacheGlobs(caches)
+>>> text.matchAll("foo.C"), binary.matchAll("foo.C")
+(['text/x-c++src'], ['text/x-c++src'])
+>>> all(text.matchAll(name) == binary.matchAll(name) for name in ("foo.c", "foo.TAR.GZ", "Makefile", "foo~", "libfoo.so.1"))
+True
+
+
+Tests for the XML metadata index
+
+>>> from mime.xdg.mime import MetadataFile
+>>> metadata = MetadataFile()
+>>> metadata.parsePackages()
+>>> metadata.get("text/x-python").comments["de"]
+'Python-Skript'
+>>> metadata.get("application/javascript").aliases
+['application/x-javascript', 'text/javascript']
+>>> metadata.get("application/x-does-not-exist")
+
+
+Tests for the magic parser
+
+>>> magic = MagicFile()
+>>> magic.parse("/usr/share/mime/magic")
+>>> magic.match(b"%PDF-1.4")
+'application/pdf'
+>>> magic.match(b"\\x1f\\x8b\\x08")
+'application/gzip'
+>>> magic.match(b"#!/usr/bin/env python\\n")
+'text/x-python'
+>>> magic.match(b"nothing to see here")
+>>> magic.extent() > 0
+True
+>>> len(magic.candidates(b"\\x89PNG\\r\\n\\x1a\\n")) < 5
+True
+
+A database without magic rules still tells text from empty files
+
+>>> base = tempfile.mkdtemp()
+>>> os.makedirs(os.path.join(base, "mime", "packages"))
+>>> _ = open(os.path.join(base, "mime", "packages", "test.xml"), "w").write('''<?xml version="1.0"?>
+... <mime-info xmlns="http://www.freedesktop.org/standards/shared-mime-info">
+... <mime-type type="text/x-a"><glob pattern="*.zz"/></mime-type>
+... </mime-info>''')
+>>> subprocess.check_call(["update-mime-database", os.path.join(base, "mime")], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+0
+>>> _ = open(os.path.join(base, "hello.txt"), "w").write("hello\\n")
+>>> _ = open(os.path.join(base, "empty"), "w")
+>>> import sys
+>>> env = dict(os.environ, XDG_DATA_HOME=base, XDG_DATA_DIRS=base, XDG_CACHE_HOME=base)
+>>> code = "import sys; from mime import MimeType; print(*[MimeType.fromContent(path).name() for path in sys.argv[1:]])"
+>>> subprocess.check_output([sys.executable, "-c", code, os.path.join(base, "hello.txt"), os.path.join(base, "empty")], env=env)
+b'text/plain application/x-zerosize\\n'
+>>> shutil.rmtree(base)
+
+
+Tests for the snapshot
+
+>>> from mime.xdg import snapshot
+>>> magic = MagicFile()
+>>> magic.parse("/usr/share/mime/magic")
+>>> snap = snapshot.Snapshot("snapshot.tmp", ("key", ))
+>>> snap.get("mime/magic", lambda: magic) is magic
+True
+>>> snap.save()
+>>> snap = snapshot.Snapshot("snapshot.tmp", ("key", ))
+>>> snap.load()
+True
+>>> snap.get("mime/magic", None).match(b"%PDF-1.4")
+'application/pdf'
+>>> snap.get("mime/magic", None).extent() == magic.extent()
+True
+>>> snapshot.Snapshot("snapshot.tmp", ("other key", )).load()
+False
+>>> os.remove("snapshot.tmp")
+
+Without the module sources to key it on, as in a zip, there is no snapshot
+
+>>> source = snapshot.__file__
+>>> snapshot.__file__ = os.path.join("does-not-exist.zip", "mime", "xdg", "snapshot.pyc")
+>>> key = snapshot.getKey()
+>>> snapshot.__file__ = source
+>>> key
+>>> snap = snapshot.Snapshot("snapshot.tmp", key)
+>>> snap.load()
+False
+>>> snap.get("mime/magic", lambda: magic) is magic
+True
+>>> snap.save()
+>>> os.path.exists("snapshot.tmp")
+False
+
+Tables built from the applications tree are rebuilt when any of its
+directories changes, without changing the key of the others
+
+>>> os.makedirs("data.tmp/applications/vendor")
+>>> data = xdg.XDG_DATA_DIRS[:]
+>>> xdg.XDG_DATA_DIRS[:] = [os.path.abspath("data.tmp")]
+>>> xdg.invalidateFiles()
+>>> key = snapshot.getKey()
+>>> snap = snapshot.Snapshot("snapshot.tmp", key)
+>>> snap.get("tree", lambda: "built", ("applications", )), snap.get("tree", lambda: "rebuilt", ("applications", ))
+('built', 'built')
+>>> os.utime("data.tmp/applications/vendor", (0, 0))
+>>> snap.get("tree", lambda: "rebuilt", ("applications", ))
+'rebuilt'
+>>> snapshot.getKey() == key
+True
+>>> xdg.XDG_DATA_DIRS[:] = data
+>>> xdg.invalidateFiles()
+>>> shutil.rmtree("data.tmp")
+
+
+Tests for change detection
+
+>>> from mime.xdg import xdg
+>>> from mime.xdg.database import Database
+>>> path = os.path.abspath("globs2.tmp")
+>>> _ = open(path, "w").write("50:text/x-foo:*.foo\\n")
+>>> def loadGlobs():
+...     ret = GlobsFile()
+...     ret.parse(path)
+...     return ret
+>>> table = xdg.LazyTable(loadGlobs)
+>>> database = Database()
+>>> database.add(table, path)
+>>> results = xdg.LRUCache("results", 4)
+>>> database.addCache(results)
+>>> database.refresh()
+[]
+>>> table.match("file.foo")
+'text/x-foo'
+>>> results.set("file.foo", "text/x-foo")
+>>> database.refresh()
+[]
+>>> len(results)
+1
+>>> _ = open(path, "w").write("50:text/x-foobar:*.foo\\n")
+>>> database.refresh() == [table]
+True
+>>> len(results)
+0
+>>> table.match("file.foo")
+'text/x-foobar'
+>>> os.remove(path)
+>>> mimemodule.refresh()
+[]
+
+Rebuilt tables don't come back from the snapshot
+
+>>> base = tempfile.mkdtemp()
+>>> os.makedirs(os.path.join(base, "applications"))
+>>> _ = open(os.path.join(base, "applications", "mimeapps.list"), "w").write("[Added Associations]\\n[Removed Associations]\\n[Default Applications]\\ntext/x-foo=foo.desktop\\n")
+>>> env = dict(os.environ, XDG_DATA_HOME=base, XDG_DATA_DIRS=base, XDG_CACHE_HOME=base)
+>>> code = '''if 1:
+...     import os, sys, mime
+...     print(mime.MimeType("text/x-foo").defaultApplication())
+...     open(os.path.join(sys.argv[1], "applications", "foo.desktop"), "w").close()
+...     print(len(mime.refresh()), mime.MimeType("text/x-foo").defaultApplication())'''
+>>> subprocess.check_output([sys.executable, "-c", code, base], env=env)
+b'None\\n2 foo.desktop\\n'
+
+Desktop files added to subdirectories of applications are noticed too
+
+>>> os.makedirs(os.path.join(base, "applications", "kde4"))
+>>> code = '''if 1:
+...     import os, sys, mime
+...     from mime.xdg import xdg
+...     print(xdg.getDesktopFilePath("kde4-kate.desktop"))
+...     open(os.path.join(sys.argv[1], "applications", "kde4", "kate.desktop"), "w").close()
+...     print(xdg.DESKTOP_FILES in mime.refresh(), os.path.relpath(xdg.getDesktopFilePath("kde4-kate.desktop"), sys.argv[1]))'''
+>>> subprocess.check_output([sys.executable, "-c", code, base], env=env)
+b'None\\nTrue applications/kde4/kate.desktop\\n'
+>>> shutil.rmtree(base)
+
+
+Tests for the result caches
+
+>>> cache = xdg.LRUCache("test", 2)
+>>> cache.set("a", 1)
+>>> cache.set("b", 2)
+>>> cache.get("a")
+1
+>>> cache.set("c", 3)
+>>> cache.get("b"), cache.get("a"), cache.get("c")
+(None, 1, 3)
+>>> cache.hits, cache.misses, cache.evictions
+(3, 1, 1)
+>>> cache.resize(1)
+>>> len(cache), cache.evictions
+(1, 2)
+>>> from mime.xdg.mime import CONTENTS, NAMES
+>>> NAMES.resize(16)
+>>> CONTENTS.resize(16)
+>>> MimeType.fromName("file.txt"), MimeType.fromName("file.txt"), MimeType.fromName("file.unknown-extension")
+(<MimeType: text/plain>, <MimeType: text/plain>, None)
+>>> NAMES.hits, NAMES.misses
+(1, 2)
+>>> _ = open("contents.tmp", "w").write("hello")
+>>> MimeType.fromContent("contents.tmp"), MimeType.fromContent("contents.tmp")
+(<MimeType: text/plain>, <MimeType: text/plain>)
+>>> CONTENTS.hits
+1
+>>> _ = open("contents.tmp", "wb").write(b"\\x89PNG\\r\\n\\x1a\\n")
+>>> MimeType.fromContent("contents.tmp")
+<MimeType: image/png>
+>>> os.remove("contents.tmp")
+>>> NAMES.resize(0)
+>>> CONTENTS.resize(0)
 
 
 Tests for MIME actions
@@ -115,6 +535,201 @@ Tests for MIME actions
 True
 
 >>> os.remove(f.name)
+
+>>> from mime.xdg.xdg import DesktopFileIndex
+>>> os.makedirs("applications.tmp/kde4")
+>>> os.makedirs("applications2.tmp")
+>>> for path in ("applications.tmp/gedit.desktop", "applications.tmp/kde4/kate.desktop", "applications2.tmp/gedit.desktop", "applications2.tmp/vim.desktop"):
+...     open(path, "w").close()
+>>> index = DesktopFileIndex(["applications.tmp", "applications2.tmp"])
+>>> index.get("kde4-kate.desktop")
+'applications.tmp/kde4/kate.desktop'
+>>> index.get("gedit.desktop")
+'applications.tmp/gedit.desktop'
+>>> index.get("vim.desktop")
+'applications2.tmp/vim.desktop'
+>>> index.get("kate.desktop")
+>>> os.symlink("..", "applications.tmp/kde4/loop")
+>>> sorted(DesktopFileIndex(["applications.tmp"])._paths)
+['gedit.desktop', 'kde4-kate.desktop']
+>>> import shutil
+>>> shutil.rmtree("applications.tmp")
+>>> shutil.rmtree("applications2.tmp")
+
+>>> from mime.xdg.actions import CacheFile
+>>> f = open("mimeinfo.cache.tmp", "w")
+>>> _ = f.write('''
+... [MIME Cache]
+... text/plain=gedit.desktop;kwrite.desktop;juffed.desktop;
+... '''
+... )
+>>> f.close()
+>>> mimeinfo = CacheFile()
+>>> mimeinfo.parse(f.name)
+>>> mimeinfo.associationsFor("text/plain", exclude=["kwrite.desktop"])
+['juffed.desktop', 'gedit.desktop']
+>>> mimeinfo.associationsFor("text/html")
+[]
+>>> isinstance(MimeType("text/x-does-not-exist").associations(), list)
+True
+>>> f = open("mimeinfo.cache.tmp", "w")
+>>> _ = f.write('''
+... [Desktop Entry]
+... text/html=ignored.desktop;
+...
+... [MIME Cache]
+... # The applications of later files come first
+... Text/Plain=kate.desktop;
+... text/html=chromium.desktop;;firefox.desktop;
+... '''
+... )
+>>> f.close()
+>>> mimeinfo.parse(f.name)
+>>> mimeinfo.associationsFor("text/plain")
+['kate.desktop', 'juffed.desktop', 'kwrite.desktop', 'gedit.desktop']
+>>> mimeinfo.associationsFor("text/html")
+['firefox.desktop', 'chromium.desktop']
+>>> os.remove(f.name)
+
+Tests for sniffing buffers and streams
+
+>>> import io
+>>> png = b"\\x89PNG\\r\\n\\x1a\\n" + b"\\0" * 8
+>>> MimeType.fromBytes(png)
+<MimeType: image/png>
+>>> MimeType.fromBytes(memoryview(bytearray(png)))
+<MimeType: image/png>
+>>> MimeType.fromBytes(png, "image.bin")
+<MimeType: image/png>
+>>> MimeType.fromBytes(b"", "notes.txt")
+<MimeType: text/plain>
+>>> MimeType.fromBytes(b"print('hello')", "script.py")
+<MimeType: text/x-python>
+>>> MimeType.fromBytes(open("setup.py", "rb").read()) == MimeType.fromContent("setup.py")
+True
+>>> stream = io.BytesIO(png + b"\\0" * 100000)
+>>> MimeType.fromStream(stream)
+<MimeType: image/png>
+>>> from mime.xdg.mime import MAGIC
+>>> stream.tell() == MAGIC.extent()
+True
+>>> stream = io.BytesIO(png)
+>>> MimeType.fromStream(stream, "image.png")
+<MimeType: image/png>
+>>> stream.tell()
+0
+
+Tests for statistics
+
+>>> from mime import statistics, stats
+>>> stats()["enabled"]
+False
+>>> statistics.enable()
+>>> events = []
+>>> hook = lambda kind, name, value: events.append((kind, name))
+>>> statistics.addHook(hook)
+>>> _ = open("globs2.tmp", "w").write("50:text/x-c++:*.C:cs\\n50:text/x-c:*.c\\n50:text/x-java:*.java\\n50:text/x-makefile:makefile\\n10:text/x-readme:readme*\\n")
+>>> globs = GlobsFile()
+>>> globs.parse("globs2.tmp")
+>>> [globs.match(name) for name in ("a.c", "a.C", "A.JAVA", "makefile", "Makefile", "README.md", "a.txt")]
+['text/x-c', 'text/x-c++', 'text/x-java', 'text/x-makefile', 'text/x-makefile', 'text/x-readme', '']
+>>> os.remove("globs2.tmp")
+>>> MimeType.fromBytes(b"\\x89PNG\\r\\n\\x1a\\n")
+<MimeType: image/png>
+>>> counters = stats()["counters"]
+>>> sorted((name, n) for name, n in counters.items() if name.startswith(("globs.", "sniff.")))
+[('globs.extension', 2), ('globs.folded-extension', 1), ('globs.folded-literal', 1), ('globs.folded-pattern', 1), ('globs.literal', 1), ('globs.miss', 1), ('sniff.bytes', 8), ('sniff.files', 1), ('sniff.magic', 1)]
+>>> ("count", "sniff.files") in events
+True
+>>> statistics.removeHook(hook)
+>>> statistics.disable()
+>>> statistics.reset()
+>>> _ = MimeType.fromBytes(b"text")
+>>> stats()["counters"]
+{}
+
+Tests for bulk classification
+
+>>> from mime import bulk
+>>> paths = ["setup.py", "README", "does-not-exist", "mime", "tests/__init__.py"]
+>>> list(bulk.classify(paths, processes=2, chunksize=2))
+[(0, 'text/x-python'), (1, 'text/x-readme'), (2, None), (3, 'inode/directory'), (4, 'text/x-python')]
+>>> sorted(bulk.classify(paths, processes=2, chunksize=2, ordered=False)) == list(bulk.classify(paths, processes=1))
+True
+>>> read = []
+>>> def generate():
+...     for i in range(10000):
+...         read.append(i)
+...         yield "setup.py"
+>>> results = bulk.classify(generate(), processes=2, chunksize=10)
+>>> next(results), len(read) <= 2 * bulk.BACKLOG * 10
+((0, 'text/x-python'), True)
+>>> results.close()
+>>> list(bulk.classify(paths, processes=1, by=bulk.BY_NAME))
+[(0, 'text/x-python'), (1, 'text/x-readme'), (2, None), (3, None), (4, 'text/x-python')]
+>>> list(bulk.classify(paths, processes=2, by=bulk.BY_CONTENT))[:2]
+[(0, 'text/x-python'), (1, 'text/plain')]
+
+Tests for the command-line classifier
+
+>>> import subprocess, sys
+>>> env = dict(os.environ, XDG_CACHE_HOME=tempfile.mkdtemp())
+>>> def run(args, input=b""):
+...     return subprocess.run([sys.executable, "-m", "mime"] + args, input=input, stdout=subprocess.PIPE, env=env, check=True).stdout.decode()
+>>> run(["setup.py", "does-not-exist"])
+'setup.py\\ttext/x-python\\ndoes-not-exist\\t\\n'
+>>> print(run(["-f", "json"], b"setup.py\\nmime\\n"), end="")
+{"path": "setup.py", "type": "text/x-python"}
+{"path": "mime", "type": "inode/directory"}
+>>> run(["-0"], b"setup.py\\0new\\nline\\0")
+'setup.py\\ttext/x-python\\x00new\\nline\\t\\x00'
+>>> run(["-z", "-u", "-j", "2", "setup.py"])
+'setup.py\\ttext/x-python\\x00'
+>>> run(["-m", "name", "-j", "2"], b"README\\nsetup.py")
+'README\\ttext/x-readme\\nsetup.py\\ttext/x-python\\n'
+>>> shutil.rmtree(env["XDG_CACHE_HOME"])
+
+Tests for the asyncio API
+
+>>> import asyncio
+>>> from mime import aio
+
+The tables are first loaded in the executor, off the event loop thread
+
+>>> env = dict(os.environ, XDG_CACHE_HOME=tempfile.mkdtemp())
+>>> code = '''if 1:
+...     import asyncio, threading
+...     from mime import aio
+...     from mime.xdg import mime
+...     loader = mime.GLOBS._loader
+...     def load(*args):
+...         print(threading.current_thread() is threading.main_thread())
+...         return loader(*args)
+...     mime.GLOBS._loader = load
+...     print(asyncio.run(aio.fromPath("setup.py")))'''
+>>> subprocess.check_output([sys.executable, "-c", code], env=env)
+b'False\\ntext/x-python\\n'
+>>> shutil.rmtree(env["XDG_CACHE_HOME"])
+>>> asyncio.run(aio.fromPath("setup.py"))
+<MimeType: text/x-python>
+>>> asyncio.run(aio.fromContent("setup.py"))
+<MimeType: text/x-python>
+>>> asyncio.run(aio.fromPath("does-not-exist"))
+>>> async def scan(root):
+...     return dict([(path, m) async for path, m in aio.scan(root)])
+>>> from mime.xdg.scan import scan as walk
+>>> asyncio.run(scan("mime")) == dict(walk("mime"))
+True
+>>> async def sniff(data, name=None):
+...     reader = asyncio.StreamReader()
+...     reader.feed_data(data)
+...     reader.feed_eof()
+...     m, prefix = await aio.fromStreamReader(reader, name)
+...     return m, len(prefix), await reader.read()
+>>> asyncio.run(sniff(b"\\x89PNG\\r\\n\\x1a\\n" + b"\\0" * 8))
+(<MimeType: image/png>, 16, b'')
+>>> asyncio.run(sniff(b"\\x89PNG\\r\\n\\x1a\\n", "image.png"))
+(<MimeType: image/png>, 0, b'\\x89PNG\\r\\n\\x1a\\n')
 """
 
 if __name__ == "__main__":